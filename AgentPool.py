@@ -0,0 +1,43 @@
+import numpy as np
+
+from Controller import Controller, LINEAR
+from FlappyBirdAgent import FlappyBirdAgent
+
+INITIAL_WEIGHT = 0.1
+
+
+# Fixed set of agents whose brains are rows of one (size, parameters) weight matrix.
+# A new generation is written into the same rows and agents instead of allocating new ones.
+class AgentPool:
+    def __init__(self, size: int, rng: np.random.Generator = None, controller: Controller = LINEAR):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.controller = controller
+        self.weights = self.random_weights(size)
+        self.agents: list[FlappyBirdAgent] = [FlappyBirdAgent(row, controller) for row in self.weights]
+
+    def __len__(self):
+        return len(self.agents)
+
+    # Brains a new FlappyBirdAgent would start with
+    def random_weights(self, count: int) -> np.ndarray:
+        return self.rng.uniform(-INITIAL_WEIGHT, INITIAL_WEIGHT, (count, self.controller.parameter_count))
+
+    # Moves the weight matrix into buffer (shared memory, see SharedPopulation), the agents' brains follow it
+    def rebind(self, buffer: np.ndarray):
+        buffer[:] = self.weights
+        self.weights = buffer
+        for agent, row in zip(self.agents, buffer):
+            agent.brain.weights = row
+
+    def assign(self, weights) -> list[FlappyBirdAgent]:
+        # weights may hold rows of self.weights, np.array copies them before anything gets overwritten
+        weights = np.array(weights, dtype=np.float64).reshape(-1, self.controller.parameter_count)[:len(self.agents)]
+        count = len(weights)
+        self.weights[:count] = weights
+
+        # Slots nobody was bred for get a fresh random brain
+        self.weights[count:] = self.random_weights(len(self.agents) - count)
+
+        for agent in self.agents:
+            agent.spawn()
+        return self.agents
@@ -0,0 +1,38 @@
+import os
+
+import pygame
+
+# Scaled images are kept here as raw RGBA pixels, loading them skips PNG decoding and scaling
+ASSET_CACHE_DIR = ".asset_cache"
+
+
+def _cache_path(path: str, size: tuple[int, int]) -> str:
+    # The source file's modification time is part of the name, an edited PNG never hits a stale entry
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(ASSET_CACHE_DIR, f"{name}-{size[0]}x{size[1]}-{stat.st_mtime_ns}-{stat.st_size}.rgba")
+
+
+# The image at path scaled to size, decoded and scaled only on the first run at that resolution
+def load_scaled(path: str, size: tuple[float, float]) -> pygame.Surface:
+    size = (int(size[0]), int(size[1]))
+    cache_path = _cache_path(path, size)
+    try:
+        with open(cache_path, "rb") as file:
+            pixels = file.read()
+        if len(pixels) == size[0] * size[1] * 4:
+            return pygame.image.frombytes(pixels, size, "RGBA")
+    except OSError:
+        pass
+
+    surface = pygame.transform.scale(pygame.image.load(path), size)
+    try:
+        os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+        temporary = f"{cache_path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(pygame.image.tobytes(surface, "RGBA"))
+        os.replace(temporary, cache_path)
+    except OSError:
+        # A read-only checkout still runs, it just decodes the PNG every time
+        pass
+    return surface
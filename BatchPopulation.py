@@ -0,0 +1,289 @@
+import numpy as np
+
+from Controller import Controller, LINEAR
+from FlappyBirdAgent import FlappyBirdAgent
+from GAME_CONSTANTS import SCREEN_WIDTH, SCREEN_HEIGHT, BIRD_DIMENSION, VELOCITY_AFTER_FLAP, \
+    MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE, STALL_FRAMES
+from Instrumentation import NULL_PROFILER
+from Physics import FixedTimestep, TICK, integrate, swept_step_collision
+from Simulation import Simulation
+
+# Whole population stored as one array per attribute (structure of arrays), so every phase
+# of a tick is a single NumPy operation instead of a Python loop over FlappyBirdAgent objects.
+# Coordinates follow FlappyBirdAgent: x is the height of the bird, y its position along the screen.
+#
+# A tick only works on the live_* arrays, which hold the birds still alive packed together. Birds that die
+# are dropped from them by mask compaction, so the cost of a step follows the number of survivors.
+# live_rows maps every live bird back to its row in the full arrays. x and velocity of the dead are frozen at
+# the moment they died, sync() copies those of the survivors into the full arrays.
+class BatchPopulation:
+    # results are score, distance_traveled, gap_closeness and alive arrays to fill in place. With them the inputs
+    # are used as they are instead of copied, so the full arrays can live in shared memory (see SharedPopulation).
+    def __init__(self, weights, x, y, velocity, controller: Controller = LINEAR, results=None):
+        # Runs the brains, every row of weights is one bird's parameter vector
+        self.controller = controller
+        array = np.array if results is None else np.asarray
+        self.weights = array(weights, dtype=np.float64).reshape(-1, controller.parameter_count)
+        self.x = array(x, dtype=np.float64)
+        self.y = array(y, dtype=np.float64)
+        self.velocity = array(velocity, dtype=np.float64)
+        if results is None:
+            self.score = np.zeros(len(self.weights), dtype=np.int64)
+            # Pixels the course scrolled while the bird was alive, and ticks alive weighted by how close to the centre
+            # of the gap ahead it flew (1 dead centre, 0 half a screen away). Fitness is built from both and the score.
+            self.distance_traveled = np.zeros(len(self.weights), dtype=np.float64)
+            self.gap_closeness = np.zeros(len(self.weights), dtype=np.float64)
+            self.alive = np.ones(len(self.weights), dtype=bool)
+        else:
+            self.score, self.distance_traveled, self.gap_closeness, self.alive = results
+            self.score[:] = 0
+            self.distance_traveled[:] = 0
+            self.gap_closeness[:] = 0
+            self.alive[:] = True
+        # Where the birds started, so a clone can start its parent's run again (see pin)
+        self.spawn_x = self.x.copy()
+        self.spawn_y = self.y.copy()
+        self.spawn_velocity = self.velocity.copy()
+        self.last_decision = None
+        self.compact()
+
+    def __len__(self):
+        return len(self.weights)
+
+    @classmethod
+    def from_agents(cls, birds: list[FlappyBirdAgent]) -> "BatchPopulation":
+        population = cls([bird.brain.weights for bird in birds],
+                         [bird.x for bird in birds],
+                         [bird.y for bird in birds],
+                         [bird.velocity for bird in birds],
+                         birds[0].brain.controller if birds else LINEAR)
+        population.alive[:] = [bird.is_alive for bird in birds]
+        population.score[:] = [bird.score for bird in birds]
+        population.distance_traveled[:] = [bird.distance_traveled for bird in birds]
+        population.compact()
+        return population
+
+    # Rows start where source_rows of source started. Clones put where their parent started replay its run
+    # exactly on a fixed course, which is what lets FitnessCache skip them.
+    def pin(self, rows: np.ndarray, source: "BatchPopulation", source_rows: np.ndarray):
+        self.x[rows] = self.spawn_x[rows] = source.spawn_x[source_rows]
+        self.y[rows] = self.spawn_y[rows] = source.spawn_y[source_rows]
+        self.velocity[rows] = self.spawn_velocity[rows] = source.spawn_velocity[source_rows]
+        self.compact()
+
+    # Fresh generation at random starting positions, drawn like set_bird_def does for single agents
+    @classmethod
+    def spawn(cls, weights, rng: np.random.Generator, controller: Controller = LINEAR) -> "BatchPopulation":
+        count = len(weights)
+        x = rng.integers(SCREEN_HEIGHT // 4, SCREEN_HEIGHT // 2, count, endpoint=True)
+        y = rng.integers(SCREEN_WIDTH // 20, SCREEN_WIDTH // 5, count, endpoint=True)
+        return cls(weights, x, y, np.full(count, VELOCITY_AFTER_FLAP), controller)
+
+    # Same birds and starting state, rows picked out of this population
+    def subset(self, rows: np.ndarray) -> "BatchPopulation":
+        return BatchPopulation(self.weights[rows], self.x[rows], self.y[rows], self.velocity[rows], self.controller)
+
+    # Rebuilds the live arrays from the full ones and the alive mask
+    def compact(self):
+        self.live_rows = np.flatnonzero(self.alive)
+        self.live_weights = self.weights[self.live_rows]
+        self.live_x = self.x[self.live_rows]
+        self.live_y = self.y[self.live_rows]
+        self.live_velocity = self.velocity[self.live_rows]
+
+    def sync(self):
+        self.x[self.live_rows] = self.live_x
+        self.velocity[self.live_rows] = self.live_velocity
+
+    # Drops the live birds flagged in dead, their last state stays in the full arrays
+    def remove(self, dead: np.ndarray):
+        rows = self.live_rows[dead]
+        self.alive[rows] = False
+        self.x[rows] = self.live_x[dead]
+        self.velocity[rows] = self.live_velocity[dead]
+
+        keep = ~dead
+        self.live_rows = self.live_rows[keep]
+        self.live_weights = self.live_weights[keep]
+        self.live_x = self.live_x[keep]
+        self.live_y = self.live_y[keep]
+        self.live_velocity = self.live_velocity[keep]
+
+    def write_back(self, birds: list[FlappyBirdAgent]):
+        self.sync()
+        for i, bird in enumerate(birds):
+            bird.x = float(self.x[i])
+            bird.y = float(self.y[i])
+            bird.velocity = float(self.velocity[i])
+            bird.is_alive = bool(self.alive[i])
+            bird.score = int(self.score[i])
+            bird.distance_traveled = int(self.distance_traveled[i])
+
+    def alive_count(self) -> int:
+        return len(self.live_rows)
+
+    # The methods below work on the live birds only, arrays they return are aligned with live_rows
+    def closest_pipes(self, simulation: Simulation) -> tuple[np.ndarray, np.ndarray]:
+        # Index version of Simulation.get_closest_pipes with course indices, -1 stands for None
+        course = simulation.course
+        first, end = simulation.first_pipe, simulation.end_pipe
+        y = self.live_y
+        index = np.minimum(course.index_at(y + simulation.scroll).astype(np.int64), end - 1)
+        next_pipe = np.clip(index + 1, first, end - 1)
+        inside = (index >= first) & (y < course.pipe_x(index) - simulation.scroll + course.pipe_width)
+        if end - first == 1:
+            inside[:] = False
+        current_pipe = np.where(inside, index, -1)
+        return current_pipe, next_pipe
+
+    def get_sensors(self, simulation: Simulation) -> np.ndarray:
+        extended = self.controller.sensors == "extended"
+        sensors = np.empty((self.alive_count(), self.controller.sensor_count))
+        sensors[:, 3] = 1
+        if extended:
+            sensors[:, 4] = self.live_velocity
+        if simulation.end_pipe == simulation.first_pipe:
+            sensors[:, 0] = SCREEN_HEIGHT // 2
+            sensors[:, 1] = SCREEN_WIDTH
+            sensors[:, 2] = SCREEN_HEIGHT // 2
+            if extended:
+                sensors[:, 5] = SCREEN_HEIGHT // 2
+            return sensors
+
+        course = simulation.course
+        current_pipe, next_pipe = self.closest_pipes(simulation)
+        measured = np.where(current_pipe >= 0, current_pipe, next_pipe)
+        left_up = course.gap_tops(measured)
+
+        sensors[:, 0] = self.live_x - left_up
+        sensors[:, 1] = course.pipe_x(next_pipe) - simulation.scroll - self.live_y
+        sensors[:, 2] = left_up + course.pipe_gap - self.live_x
+        if extended:
+            sensors[:, 5] = self.live_x - course.gap_tops(measured + 1)
+        return sensors
+
+    # Flap probability of every live bird
+    def feed_forward(self, sensors: np.ndarray) -> np.ndarray:
+        return self.controller.output(self.live_weights, sensors)
+
+    # Closeness of every live bird's centre to the centre of the gap its sensors measure, from the sensors
+    @staticmethod
+    def gap_closeness_of(sensors: np.ndarray) -> np.ndarray:
+        # sensors 0 and 2 are the distances to the top and bottom of the gap
+        offset = np.abs((sensors[:, 0] - sensors[:, 2] + BIRD_DIMENSION) / 2)
+        return np.maximum(1 - offset / (SCREEN_HEIGHT / 2), 0)
+
+    # flaps replaces the brains' decision, e.g. to play a recorded run back. The rows that decided and which
+    # of them flapped stay in last_decision for recorders.
+    def make_decision(self, sensors: np.ndarray, flaps: np.ndarray = None):
+        flap = self.controller.decide(self.live_weights, sensors) if flaps is None else flaps
+        self.live_velocity[flap] = VELOCITY_AFTER_FLAP
+        self.last_decision = (self.live_rows, flap)
+
+    # Moves the birds dt ticks on, returns the ones that left the screen
+    def update_physics(self, dt: float = 1) -> np.ndarray:
+        return integrate(self.live_x, self.live_velocity, dt)
+
+    def check_collision(self, simulation: Simulation) -> np.ndarray:
+        hit = np.zeros(self.alive_count(), dtype=bool)
+        first, end = simulation.first_pipe, simulation.end_pipe
+        if end == first:
+            return hit
+
+        # Only the pipes under the left and right edge of each bird are tested, same rules as Pipe.collides_with
+        course = simulation.course
+        x, y = self.live_x, self.live_y
+        top = x
+        bottom = top + BIRD_DIMENSION
+        for edge in (y, y + BIRD_DIMENSION):
+            index = np.clip(course.index_at(edge + simulation.scroll).astype(np.int64), first, end - 1)
+            left_y = course.pipe_x(index) - simulation.scroll
+            right_y = left_y + course.pipe_width
+            left_up = course.gap_tops(index)
+            left_down = left_up + course.pipe_gap
+            overlap = (((left_y <= y) & (y <= right_y)) |
+                       ((left_y <= y + BIRD_DIMENSION) & (y + BIRD_DIMENSION <= right_y)))
+            in_gap = (left_down >= top) & (top >= left_up) & (left_down >= bottom) & (bottom >= left_up)
+            hit |= overlap & ~in_gap
+        return hit
+
+    def step(self, simulation: Simulation, profiler=NULL_PROFILER, timestep: FixedTimestep = TICK, flaps=None):
+        with profiler.phase("sensors"):
+            sensors = self.get_sensors(simulation)
+        with profiler.phase("feed_forward"):
+            self.make_decision(sensors, flaps)
+
+        pipes = simulation.end_pipe
+        scroll = simulation.scroll
+        with profiler.phase("update_pipes"):
+            simulation.advance(timestep.dt)
+        self.score[self.live_rows] = simulation.score
+        self.distance_traveled[self.live_rows] += simulation.scroll - scroll
+        self.gap_closeness[self.live_rows] += self.gap_closeness_of(sensors) * timestep.dt
+
+        with profiler.phase("physics"):
+            if timestep.swept:
+                start_x = self.live_x.copy()
+                start_velocity = self.live_velocity.copy()
+            left_screen = self.update_physics(timestep.dt)
+        with profiler.phase("collision"):
+            if timestep.swept:
+                hit = swept_step_collision(simulation.course, start_x, start_velocity, self.live_y, scroll,
+                                           simulation.scroll, timestep, simulation.end_pipe)
+            else:
+                hit = self.check_collision(simulation)
+            dead = left_screen | hit
+            if dead.any():
+                self.remove(dead)
+
+        if profiler.enabled:
+            profiler.count("steps")
+            profiler.count("collisions", int(np.count_nonzero(hit & ~left_screen)))
+            profiler.count("pipes_spawned", simulation.end_pipe - pipes)
+
+
+# Ends a generation early once the number of survivors has not changed for `patience` steps:
+# the birds left are then all flying the course equally well and running on only adds the same distance to each.
+# A patience of 0 turns it off.
+class StallDetector:
+    def __init__(self, patience: int = STALL_FRAMES):
+        self.patience = patience
+        self.survivors = -1
+        self.unchanged = 0
+
+    def update(self, survivors: int) -> bool:
+        if survivors != self.survivors:
+            self.survivors = survivors
+            self.unchanged = 0
+            return False
+        self.unchanged += 1
+        return 0 < self.patience <= self.unchanged
+
+
+# Plays one generation to the end, returns True when it was cut by the frame or score limit or the stall detector
+def run_generation(population: BatchPopulation, simulation: Simulation, max_frames=MAX_GENERATION_FRAMES,
+                   max_score=MAX_GENERATION_SCORE, seed=None, profiler=NULL_PROFILER,
+                   stall_frames=STALL_FRAMES, timestep: FixedTimestep = TICK, recorder=None, metrics=None) -> bool:
+    simulation.reset(seed)
+    simulation.update_pipes()
+    stall = StallDetector(stall_frames)
+    if recorder is not None:
+        recorder.begin(population, simulation, timestep)
+
+    frame_count = 0
+    timed_out = False
+    while population.alive_count() > 0:
+        population.step(simulation, profiler, timestep)
+        if recorder is not None:
+            recorder.observe(population)
+        if metrics is not None:
+            metrics.observe(population)
+
+        # Counted in ticks, so the limit means the same game time whatever the timestep
+        frame_count += timestep.dt
+        if frame_count > max_frames or simulation.score >= max_score or stall.update(population.alive_count()):
+            timed_out = True
+            break
+
+    population.sync()
+    return timed_out
@@ -11,10 +11,13 @@ class Button:
         self.color_button = color_button
         self.color_text = color_text
         self.size = size
-        font = pygame.font.SysFont("Arial", size // 3)
-        self.text_surface = font.render(self.text, True, color_text)
+        self.text_surface = None
 
     def draw(self) -> None:
+        # The font lookup is left to the first draw, a button that is never shown never loads it
+        if self.text_surface is None:
+            font = pygame.font.SysFont("Arial", self.size // 3)
+            self.text_surface = font.render(self.text, True, self.color_text)
         pygame.draw.rect(self.screen, self.color_button, self.rec)
         self.screen.blit(self.text_surface, self.position_text)
 
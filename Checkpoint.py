@@ -0,0 +1,165 @@
+import os
+import random
+import struct
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+from Controller import Controller, LINEAR, SPEC_LENGTH, pack_spec, unpack_spec
+from FlappyBirdAgent import FlappyBirdAgent
+from GeneticAlgorithm import GeneticAlgorithm
+
+MAGIC = b"FBCK"
+VERSION = 6
+ALIGNMENT = 64
+# magic, version, weights per bird, generation, population, best score, has champion, has seed, seed, has gauss, gauss,
+# has curriculum tiers
+HEADER = struct.Struct("<4sHIIIiBBqBdB")
+# random.getstate() holds 624 Mersenne Twister words plus the position in them
+RNG_WORDS = 625
+# state, increment, has_uint32, uinteger of the PCG64 generator behind GeneticAlgorithm.rng
+NUMPY_RNG = struct.Struct("<16s16sII")
+
+# Checkpoint file layout, all little endian:
+#   header | controller spec (uint16 length + ASCII) | random module state (625 x uint32) | numpy generator state |
+#   champion weights (float32) | padding | population weights | padding | spawn state | curriculum tiers
+# The spawn state is x, y and velocity (float64) of every bird at the start of the saved generation, the
+# curriculum tiers (int64, one per bird) are only there for curriculum runs.
+# The population is one contiguous float32 block aligned to 64 bytes, so it can be memory mapped directly.
+
+
+class Checkpoint:
+    def __init__(self, generation: int, weights: np.ndarray, rng_state: tuple, numpy_rng_state: dict, best_weights,
+                 best_score: int, seed=None, controller: Controller = LINEAR, spawn: np.ndarray = None,
+                 tiers: np.ndarray = None):
+        self.generation = generation
+        self.weights = weights
+        self.rng_state = rng_state
+        self.numpy_rng_state = numpy_rng_state
+        self.best_weights = best_weights
+        self.best_score = best_score
+        self.seed = seed
+        self.controller = controller
+        # (population, 3) x, y and velocity the birds start the saved generation from
+        self.spawn = spawn
+        # Curriculum.tier_of of the saved generation, None when the run had no curriculum
+        self.tiers = tiers
+
+
+def _population_offset(weight_count: int, spec_size: int) -> int:
+    end = HEADER.size + spec_size + RNG_WORDS * 4 + NUMPY_RNG.size + weight_count * 4
+    return (end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _spawn_offset(population: int, weight_count: int, spec_size: int) -> int:
+    end = _population_offset(weight_count, spec_size) + population * weight_count * 4
+    return (end + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _pack_numpy_rng(rng: np.random.Generator) -> bytes:
+    state = rng.bit_generator.state
+    if state["bit_generator"] != "PCG64":
+        raise ValueError(f"cannot save the state of a {state['bit_generator']} generator")
+    return NUMPY_RNG.pack(state["state"]["state"].to_bytes(16, "little"), state["state"]["inc"].to_bytes(16, "little"),
+                          state["has_uint32"], state["uinteger"])
+
+
+def _unpack_numpy_rng(data: bytes) -> dict:
+    state, inc, has_uint32, uinteger = NUMPY_RNG.unpack(data)
+    return {"bit_generator": "PCG64",
+            "state": {"state": int.from_bytes(state, "little"), "inc": int.from_bytes(inc, "little")},
+            "has_uint32": has_uint32, "uinteger": uinteger}
+
+
+# population is the generation about to be played, spawned but not stepped yet. Without it the spawn state
+# is taken from the pool's agents. tiers is the curriculum's tier_of for that generation.
+def save_checkpoint(path: str, ga: GeneticAlgorithm, seed=None, population: BatchPopulation = None,
+                    tiers: np.ndarray = None):
+    weights = ga.pool.weights.astype(np.float32)
+    if population is not None:
+        spawn = np.column_stack((population.spawn_x, population.spawn_y, population.spawn_velocity))
+    else:
+        spawn = np.array([(bird.x, bird.y, bird.velocity) for bird in ga.pool.agents], dtype=np.float64)
+    population, weight_count = weights.shape
+    version, internal_state, gauss = random.getstate()
+
+    header = HEADER.pack(MAGIC, VERSION, weight_count, ga.current_generation, population, ga.best_score,
+                         ga.best_weights is not None, seed is not None, seed if seed is not None else 0,
+                         gauss is not None, gauss if gauss is not None else 0.0, tiers is not None)
+    spec = pack_spec(ga.controller)
+    champion = np.zeros(weight_count, dtype=np.float32)
+    if ga.best_weights is not None:
+        champion[:] = ga.best_weights
+
+    # Written next to the target and renamed over it, a crash never leaves a half written checkpoint behind
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        file.write(spec)
+        file.write(np.asarray(internal_state, dtype=np.uint32).tobytes())
+        file.write(_pack_numpy_rng(ga.rng))
+        file.write(champion.tobytes())
+        file.write(b"\0" * (_population_offset(weight_count, len(spec)) - file.tell()))
+        file.write(weights.tobytes())
+        file.write(b"\0" * (_spawn_offset(population, weight_count, len(spec)) - file.tell()))
+        file.write(spawn.astype(np.float64).tobytes())
+        if tiers is not None:
+            file.write(np.asarray(tiers, dtype=np.int64).tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path: str) -> Checkpoint:
+    with open(path, "rb") as file:
+        (magic, version, weight_count, generation, population, best_score, has_champion, has_seed, seed,
+         has_gauss, gauss, has_tiers) = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} checkpoint")
+        length = file.read(SPEC_LENGTH.size)
+        spec = length + file.read(SPEC_LENGTH.unpack(length)[0])
+        controller, _ = unpack_spec(spec)
+        internal_state = tuple(int(word) for word in np.frombuffer(file.read(RNG_WORDS * 4), dtype=np.uint32))
+        numpy_rng_state = _unpack_numpy_rng(file.read(NUMPY_RNG.size))
+        champion = np.frombuffer(file.read(weight_count * 4), dtype=np.float32)
+        file.seek(_spawn_offset(population, weight_count, len(spec)))
+        spawn = np.frombuffer(file.read(population * 3 * 8), dtype=np.float64).reshape(population, 3)
+        tiers = np.frombuffer(file.read(population * 8), dtype=np.int64).copy() if has_tiers else None
+
+    # The population is only paged in when it is read
+    weights = np.memmap(path, dtype=np.float32, mode="r", offset=_population_offset(weight_count, len(spec)),
+                        shape=(population, weight_count))
+    rng_state = (3, internal_state, gauss if has_gauss else None)
+    return Checkpoint(generation, weights, rng_state, numpy_rng_state, champion.tolist() if has_champion else None, best_score,
+                      seed if has_seed else None, controller, spawn, tiers)
+
+
+# Rebuilds the genetic algorithm and its birds. The birds start where the saved generation started and the
+# random states are restored last, so the run goes on exactly as it would have without the interruption.
+def resume(checkpoint: Checkpoint) -> tuple[GeneticAlgorithm, list[FlappyBirdAgent]]:
+    ga = GeneticAlgorithm(population_size=len(checkpoint.weights), controller=checkpoint.controller)
+    ga.current_generation = checkpoint.generation
+    ga.best_weights = checkpoint.best_weights
+    ga.best_score = checkpoint.best_score
+
+    birds = ga.pool.assign(checkpoint.weights)
+    for bird, (x, y, velocity) in zip(birds, checkpoint.spawn.tolist()):
+        bird.x, bird.y, bird.velocity = x, y, velocity
+    random.setstate(checkpoint.rng_state)
+    ga.rng.bit_generator.state = checkpoint.numpy_rng_state
+    return ga, birds
+
+
+# Saves every `every` generations, called by the training loops once the next generation is ready
+class CheckpointWriter:
+    def __init__(self, path: str, every: int = 1, seed=None, curriculum=None):
+        self.path = path
+        self.every = max(1, every)
+        self.seed = seed
+        # Its tier_of is saved too, the birds come back on the tiers they were on
+        self.curriculum = curriculum
+
+    def after_generation(self, ga: GeneticAlgorithm, population: BatchPopulation = None):
+        if ga.current_generation % self.every == 0:
+            save_checkpoint(self.path, ga, self.seed, population,
+                            self.curriculum.tier_of if self.curriculum is not None else None)
@@ -0,0 +1,110 @@
+import struct
+
+import numpy as np
+
+# What the birds see, scaled to about -1..1 before it reaches a brain. basic is what Perceptron always used:
+# distance to the top of the gap, to the next pipe, to the bottom of the gap and a constant bias input.
+# extended adds the vertical velocity and the distance to the top of the gap after the one being measured.
+SENSOR_SCALES = {
+    "basic": np.array([1 / 1000.0, 1 / 2000.0, 1 / 1000.0, 1.0]),
+    "extended": np.array([1 / 1000.0, 1 / 2000.0, 1 / 1000.0, 1.0, 1 / 10.0, 1 / 1000.0]),
+}
+
+
+# Shape of a brain and how to run it. A bird's brain is one flat parameter vector: for every layer its
+# (inputs, outputs) weight matrix row by row, then its biases. The first layer has no biases, the constant sensor
+# takes their place, so the default controller is exactly the 4 weight Perceptron.
+# Hidden layers use tanh, the output is one flap probability per bird.
+class Controller:
+    def __init__(self, hidden=(), sensors: str = "basic"):
+        if sensors not in SENSOR_SCALES:
+            raise ValueError(f"unknown sensor set {sensors!r}")
+        if any(size < 1 for size in hidden):
+            raise ValueError(f"invalid hidden layers {hidden}")
+        self.hidden = tuple(int(size) for size in hidden)
+        self.sensors = sensors
+        self.scale = SENSOR_SCALES[sensors]
+        self.sensor_count = len(self.scale)
+
+        # (inputs, outputs, has biases) of every layer
+        sizes = (self.sensor_count,) + self.hidden + (1,)
+        self.layers = [(sizes[k], sizes[k + 1], k > 0) for k in range(len(sizes) - 1)]
+        self.parameter_count = sum(fan_in * fan_out + (fan_out if bias else 0) for fan_in, fan_out, bias in self.layers)
+
+    # Written into checkpoints, e.g. "basic" or "extended:8,8"
+    @property
+    def spec(self) -> str:
+        return self.sensors + (":" + ",".join(map(str, self.hidden)) if self.hidden else "")
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "Controller":
+        sensors, _, hidden = spec.partition(":")
+        return cls(tuple(int(size) for size in hidden.split(",")) if hidden else (), sensors)
+
+    def __eq__(self, other):
+        return isinstance(other, Controller) and self.spec == other.spec
+
+    def __hash__(self):
+        return hash(self.spec)
+
+    def __repr__(self):
+        return f"Controller(hidden={self.hidden}, sensors={self.sensors!r})"
+
+    # Output before the activation, one per row of params (birds, parameter_count) and sensors (birds, sensor_count).
+    # Every bird has its own matrices, so each layer is one batched matrix product over the whole population.
+    def logits(self, params: np.ndarray, sensors: np.ndarray) -> np.ndarray:
+        inputs = sensors * self.scale
+        if not self.hidden:
+            return np.einsum("ij,ij->i", inputs, params)
+
+        count = len(params)
+        offset = 0
+        last = len(self.layers) - 1
+        for layer, (fan_in, fan_out, bias) in enumerate(self.layers):
+            weights = params[:, offset:offset + fan_in * fan_out].reshape(count, fan_in, fan_out)
+            offset += fan_in * fan_out
+            outputs = np.matmul(inputs[:, None, :], weights)[:, 0, :]
+            if bias:
+                outputs += params[:, offset:offset + fan_out]
+                offset += fan_out
+            if layer < last:
+                np.tanh(outputs, out=outputs)
+            inputs = outputs
+        return inputs[:, 0]
+
+    # Flap probability. sigmoid(z) written as 0.5 + 0.5 * tanh(z / 2) needs no clipping, tanh never overflows.
+    def output(self, params: np.ndarray, sensors: np.ndarray) -> np.ndarray:
+        probability = self.logits(params, sensors)
+        probability *= 0.5
+        np.tanh(probability, out=probability)
+        probability *= 0.5
+        probability += 0.5
+        return probability
+
+    # Same as output(...) > 0.5 without computing the activation
+    def decide(self, params: np.ndarray, sensors: np.ndarray) -> np.ndarray:
+        return self.logits(params, sensors) > 0
+
+
+LINEAR = Controller()
+
+
+# Controller specs in files (checkpoints, policies): their length as uint16, then the spec in ASCII
+SPEC_LENGTH = struct.Struct("<H")
+
+
+def pack_spec(controller: Controller) -> bytes:
+    spec = controller.spec.encode()
+    if len(spec) > 0xFFFF:
+        raise ValueError(f"controller spec of {len(spec)} bytes is too long to store")
+    return SPEC_LENGTH.pack(len(spec)) + spec
+
+
+# Controller stored at offset of data and the offset right after it
+def unpack_spec(data: bytes, offset: int = 0) -> tuple[Controller, int]:
+    length, = SPEC_LENGTH.unpack_from(data, offset)
+    offset += SPEC_LENGTH.size
+    spec = bytes(data[offset:offset + length])
+    if len(spec) != length:
+        raise ValueError("controller spec cut off")
+    return Controller.from_spec(spec.decode()), offset + length
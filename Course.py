@@ -0,0 +1,63 @@
+import random
+from functools import lru_cache
+
+import numpy as np
+
+from Difficulty import CONSTANT, DifficultySchedule
+from GAME_CONSTANTS import SCREEN_WIDTH, SCREEN_HEIGHT
+from Pipe import Pipe
+
+COURSE_LENGTH = 256
+FIRST_PIPE_X = int(SCREEN_WIDTH * 0.33)
+
+
+# A whole pipe course generated up front from one seed. Pipe i sits at pipe_x(i) in world
+# coordinates (screen position before any scrolling) and its gap starts at gap_top[i].
+# Past the last generated pipe the gaps repeat from the beginning. The spacing of the pipes comes from the schedule.
+class Course:
+    def __init__(self, seed: int, length: int = COURSE_LENGTH, schedule: DifficultySchedule = CONSTANT):
+        self.seed = seed
+        self.schedule = schedule
+        self.pipe_gap = pipe_gap = schedule.pipe_gap
+        self.pipe_width = schedule.pipe_width
+
+        rng = np.random.default_rng(seed)
+        self.gap_top = rng.integers(int(SCREEN_HEIGHT * 0.1), int(SCREEN_HEIGHT * 0.9) - pipe_gap, size=length,
+                                    endpoint=True).astype(np.int16)
+        self.gap_top.flags.writeable = False
+
+    def __len__(self):
+        return len(self.gap_top)
+
+    # Both work on plain ints and on NumPy index arrays
+    def pipe_x(self, index):
+        return FIRST_PIPE_X + self.schedule.pipe_offset(index)
+
+    # Last pipe starting at or before world_x
+    def index_at(self, world_x):
+        return self.schedule.index_at_offset(world_x - FIRST_PIPE_X)
+
+    def gap_tops(self, indices: np.ndarray) -> np.ndarray:
+        return self.gap_top[indices % len(self.gap_top)].astype(np.float64)
+
+    def left_up(self, index: int) -> int:
+        return int(self.gap_top[index % len(self.gap_top)])
+
+    def left_down(self, index: int) -> int:
+        return self.left_up(index) + self.pipe_gap
+
+    def pipe(self, index: int, scroll: int) -> Pipe:
+        left_up = self.left_up(index)
+        return Pipe(left_up + self.pipe_gap, left_up, self.pipe_width, self.pipe_x(index) - scroll)
+
+
+# Courses are read only, so evaluators, replays and benchmarks can share the same instance
+@lru_cache(maxsize=64)
+def get_course(seed: int, length: int = COURSE_LENGTH, schedule: DifficultySchedule = CONSTANT) -> Course:
+    return Course(seed, length, schedule)
+
+
+# Seed for a course nobody asked to reproduce. Comes from the OS so the global random module,
+# which the agents and the genetic algorithm use, is left untouched.
+def random_seed() -> int:
+    return random.SystemRandom().randrange(2 ** 32)
@@ -0,0 +1,146 @@
+import numpy as np
+
+from BatchPopulation import BatchPopulation, run_generation
+from Difficulty import CLASSIC, CONSTANT, DifficultySchedule
+from Fitness import GAP_FITNESS, PIPE_FITNESS, fitness
+from GAME_CONSTANTS import MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE, STALL_FRAMES
+from Instrumentation import NULL_PROFILER
+from ParallelEvaluator import ParallelEvaluator, evaluate_shard
+from Physics import FixedTimestep, TICK
+from Simulation import Simulation
+
+# Share of a species' birds on a tier that have to reach the tier's promotion score for all of them to move up.
+# Birds that reached it move up anyway.
+PROMOTION_SHARE = 0.5
+
+
+# One rung of the curriculum: the course played on it and how long a run on it may last.
+# Birds reaching promote_score pipes on it count as having cleared it.
+class CurriculumTier:
+    def __init__(self, name: str, schedule: DifficultySchedule, max_score: int, max_frames: int,
+                 promote_score: int = None):
+        self.name = name
+        self.schedule = schedule
+        self.max_score = max_score
+        self.max_frames = max_frames
+        self.promote_score = max_score if promote_score is None else promote_score
+
+    # Highest fitness a run on this tier can reach: scrolling at top speed and dead centre in the gap for its
+    # whole length, which may overshoot max_frames by one step
+    def fitness_ceiling(self, dt: float = 1) -> float:
+        ticks = self.max_frames + dt
+        return ticks * max(self.schedule.speeds) + PIPE_FITNESS * self.max_score + GAP_FITNESS * ticks
+
+    def __repr__(self):
+        return f"CurriculumTier({self.name!r}, max_score={self.max_score}, max_frames={self.max_frames})"
+
+
+# From short runs through wide gaps to the full game with the classic difficulty curve
+TIERS = (
+    CurriculumTier("wide", DifficultySchedule(pipe_gap=300), max_score=3, max_frames=1000),
+    CurriculumTier("medium", DifficultySchedule(pipe_gap=260), max_score=8, max_frames=2000),
+    CurriculumTier("normal", CONSTANT, max_score=15, max_frames=3500),
+    CurriculumTier("classic", CLASSIC, max_score=MAX_GENERATION_SCORE, max_frames=MAX_GENERATION_FRAMES),
+)
+
+
+# Every bird plays the tier it is on, all tiers of a generation at once. Birds start on the first tier,
+# children inherit the tier of the bird they were bred from. Birds that clear their tier move up, and so do
+# the species in which most birds cleared it.
+# Cheap short courses take most of the early generations, long courses only the birds that earned them.
+class Curriculum:
+    def __init__(self, population_size: int, tiers=TIERS, stall_frames=STALL_FRAMES,
+                 timestep: FixedTimestep = TICK):
+        if len(tiers) == 0:
+            raise ValueError("a curriculum needs at least one tier")
+        self.tiers = tuple(tiers)
+        self.tier_of = np.zeros(population_size, dtype=np.int64)
+        self.stall_frames = stall_frames
+        self.timestep = timestep
+        # Fitness a bird starts from on each tier: more than any run on the tiers below can give, so a bird never
+        # ranks below one on an easier tier and fitness stays comparable across the whole population
+        self.base_fitness = np.concatenate(
+            ([0.0], np.cumsum([tier.fitness_ceiling(timestep.dt) for tier in self.tiers[:-1]])))
+        self.simulations = [Simulation(schedule=tier.schedule) for tier in self.tiers]
+
+    def tier_sizes(self) -> list[int]:
+        return np.bincount(self.tier_of, minlength=len(self.tiers)).tolist()
+
+    def describe(self) -> str:
+        return " ".join(f"{tier.name}={count}" for tier, count in zip(self.tiers, self.tier_sizes()) if count)
+
+    # Plays every bird on its tier, score, distance_traveled, gap_closeness and alive are filled in place. With an evaluator the tiers
+    # are split into shards and all of them run in its worker processes at the same time.
+    def evaluate(self, population: BatchPopulation, seed=None, evaluator: ParallelEvaluator = None,
+                 profiler=NULL_PROFILER) -> bool:
+        jobs = []
+        for index, tier in enumerate(self.tiers):
+            rows = np.flatnonzero(self.tier_of == index)
+            if len(rows) == 0:
+                continue
+            if evaluator is None:
+                jobs.append((rows, self._play(population, rows, index, seed, profiler)))
+                continue
+            for shard in np.array_split(rows, min(evaluator.workers, len(rows))):
+                jobs.append((shard, evaluator.executor.submit(
+                    evaluate_shard, population.weights[shard], population.x[shard], population.y[shard],
+                    population.velocity[shard], seed, tier.max_frames, tier.max_score, self.stall_frames,
+                    self.timestep, tier.schedule, population.controller)))
+
+        timed_out = False
+        for rows, job in jobs:
+            scores, distances, closeness, alive, job_timed_out = job if evaluator is None else job.result()
+            timed_out = timed_out or job_timed_out
+            population.score[rows] = scores
+            population.distance_traveled[rows] = distances
+            population.gap_closeness[rows] = closeness
+            population.alive[rows] = alive
+        population.compact()
+        return timed_out
+
+    def _play(self, population: BatchPopulation, rows: np.ndarray, index: int, seed, profiler):
+        tier = self.tiers[index]
+        shard = population.subset(rows)
+        with profiler.phase(f"tier_{tier.name}"):
+            timed_out = run_generation(shard, self.simulations[index], tier.max_frames, tier.max_score, seed,
+                                       profiler, self.stall_frames, self.timestep)
+        return shard.score, shard.distance_traveled, shard.gap_closeness, shard.alive, timed_out
+
+    # What the genetic algorithm selects on: the bird's fitness on its tier (Fitness.fitness) on top of its tier's base
+    def fitness(self, population: BatchPopulation) -> np.ndarray:
+        return self.base_fitness[self.tier_of] + fitness(population)
+
+    # Puts the birds back on the tiers a checkpoint saved (Checkpoint.tiers), None leaves them where they are
+    def restore(self, tiers):
+        if tiers is None:
+            return
+        if len(tiers) != len(self.tier_of) or np.any((tiers < 0) | (tiers >= len(self.tiers))):
+            raise ValueError("the saved tiers do not fit this curriculum")
+        self.tier_of[:] = tiers
+
+    # Birds on the last tier, the only ones whose scores compare with the full game
+    def last_tier_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.tier_of == len(self.tiers) - 1)
+
+    # True once a bird cleared the last tier
+    def complete(self, population: BatchPopulation) -> bool:
+        last = len(self.tiers) - 1
+        return bool(np.any((self.tier_of == last) & (population.score >= self.tiers[last].promote_score)))
+
+    # Moves the birds and species that cleared their tier up one tier, then hands the tiers down to the next generation.
+    # species_of and parents are what GeneticAlgorithm.next_generation left for the generation just bred.
+    # Returns the number of birds promoted.
+    def advance(self, scores: np.ndarray, species_of: np.ndarray, parents: np.ndarray) -> int:
+        tier_count = len(self.tiers)
+        cleared = scores >= np.array([tier.promote_score for tier in self.tiers])[self.tier_of]
+
+        # Birds are grouped by species and tier, a species spread over several tiers only moves up where it cleared
+        groups = species_of * tier_count + self.tier_of
+        group_size = np.bincount(groups)
+        group_cleared = np.bincount(groups, weights=cleared, minlength=len(group_size))
+        promoted = (cleared | (group_cleared[groups] >= PROMOTION_SHARE * group_size[groups])) & \
+            (self.tier_of < tier_count - 1)
+
+        tier_of = self.tier_of + promoted
+        self.tier_of = np.where(parents >= 0, tier_of[np.maximum(parents, 0)], 0)
+        return int(np.count_nonzero(promoted))
@@ -0,0 +1,98 @@
+import numpy as np
+
+from GAME_CONSTANTS import PIPE_SPEED, PIPE_DISTANCE, PIPE_GAP, PIPE_WIDTH, ORIGINAL_PIPE_SPEED, \
+    ORIGINAL_PIPE_DISTANCE
+
+
+# How a game gets harder as it goes. speeds[s] is the scroll speed in pixels per tick while the score is s and
+# distances[i] the space between pipe i and pipe i + 1, pipe i being the one that takes the score from i to i + 1.
+# Past the end of a curve its last value holds. Pipe positions are summed up front, so looking a pipe up stays O(1)
+# (O(log n) inside a varying distance curve).
+# Schedules are immutable and compare by value: every game, course and worker process gets its own copy
+# instead of reading module globals, and equal schedules share cached courses.
+class DifficultySchedule:
+    def __init__(self, speeds=(PIPE_SPEED,), distances=(PIPE_DISTANCE,), pipe_gap: int = PIPE_GAP,
+                 pipe_width: int = PIPE_WIDTH):
+        if len(speeds) == 0 or len(distances) == 0 or min(distances) <= 0:
+            raise ValueError("a schedule needs at least one speed and one positive distance")
+        self.speeds = tuple(speeds)
+        self.distances = tuple(distances)
+        self.pipe_gap = pipe_gap
+        self.pipe_width = pipe_width
+
+        # offsets[i] is how far pipe i sits behind pipe 0, for the pipes inside the distance curve
+        self._offsets = np.concatenate(([0], np.cumsum(self.distances[:-1])))
+        self._offsets.flags.writeable = False
+        self._last_index = len(self.distances) - 1
+        self._last_offset = int(self._offsets[-1])
+
+    @classmethod
+    def from_steps(cls, speed_steps: dict, distance_steps: dict, pipe_gap: int = PIPE_GAP,
+                   pipe_width: int = PIPE_WIDTH) -> "DifficultySchedule":
+        # {score or pipe index: value} step functions, each value holds until the next key
+        def curve(steps: dict) -> list:
+            keys = sorted(steps)
+            if keys[0] != 0:
+                raise ValueError("a step curve has to start at 0")
+            return [steps[max(key for key in keys if key <= i)] for i in range(keys[-1] + 1)]
+        return cls(curve(speed_steps), curve(distance_steps), pipe_gap, pipe_width)
+
+    def _key(self) -> tuple:
+        return self.speeds, self.distances, self.pipe_gap, self.pipe_width
+
+    def __eq__(self, other):
+        return isinstance(other, DifficultySchedule) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return f"DifficultySchedule(speeds={self.speeds}, distances={self.distances}, " \
+               f"pipe_gap={self.pipe_gap}, pipe_width={self.pipe_width})"
+
+    def speed_at(self, score: int):
+        return self.speeds[min(score, len(self.speeds) - 1)]
+
+    # Both work on plain ints and on NumPy arrays, like Course.pipe_x and Course.index_at
+    def pipe_offset(self, index):
+        if self._last_index == 0:
+            return index * self.distances[0]
+        if np.ndim(index) == 0:
+            if index < 0:
+                return index * self.distances[0]
+            if index <= self._last_index:
+                return int(self._offsets[index])
+            return self._last_offset + (index - self._last_index) * self.distances[-1]
+
+        index = np.asarray(index)
+        inside = self._offsets[np.clip(index, 0, self._last_index)]
+        beyond = self._last_offset + (index - self._last_index) * self.distances[-1]
+        return np.where(index < 0, index * self.distances[0], np.where(index <= self._last_index, inside, beyond))
+
+    # Index of the last pipe at or before offset
+    def index_at_offset(self, offset):
+        if self._last_index == 0:
+            return offset // self.distances[0]
+        if np.ndim(offset) == 0:
+            if offset < 0:
+                return offset // self.distances[0]
+            if offset < self._last_offset:
+                return int(np.searchsorted(self._offsets, offset, side="right")) - 1
+            return self._last_index + (offset - self._last_offset) // self.distances[-1]
+
+        offset = np.asarray(offset)
+        inside = np.searchsorted(self._offsets, offset, side="right") - 1
+        beyond = self._last_index + (offset - self._last_offset) // self.distances[-1]
+        before = offset // self.distances[0]
+        return np.where(offset < 0, before, np.where(offset < self._last_offset, inside, beyond))
+
+
+# The game as it always played: constant speed and distance
+CONSTANT = DifficultySchedule()
+
+# What FlappyBirdGame.increase_dificulty used to ask the global setters for: pipes 20 pixels closer from the
+# third one on and a faster scroll from a score of 9
+CLASSIC = DifficultySchedule.from_steps({0: ORIGINAL_PIPE_SPEED, 9: ORIGINAL_PIPE_SPEED + 2},
+                                        {0: ORIGINAL_PIPE_DISTANCE, 3: ORIGINAL_PIPE_DISTANCE - 20})
+
+SCHEDULES = {"constant": CONSTANT, "classic": CLASSIC}
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+
+# Fitness is counted in pixels of distance: a cleared pipe is worth PIPE_FITNESS pixels and a tick spent
+# dead centre in the gap ahead GAP_FITNESS pixels, so birds that die at the same pipe are still told apart
+PIPE_FITNESS = 100.0
+GAP_FITNESS = 1.0
+CACHE_SIZE = 1 << 16
+
+
+# What the genetic algorithm selects on, one value per bird. out, when given, receives the values
+# (SharedPopulation.fitness for one).
+def fitness(population: BatchPopulation, out: np.ndarray = None) -> np.ndarray:
+    values = population.distance_traveled + PIPE_FITNESS * population.score + GAP_FITNESS * population.gap_closeness
+    if out is None:
+        return values
+    out[:] = values
+    return out
+
+
+# Results of birds already played, keyed by their weights and starting state, the course seed and whatever else
+# decides a run (schedule, timestep, limits). A bird's run does not depend on the other birds as long as no
+# stall detection cuts the generation, so a clone starting where its parent started on the same course
+# gets its parent's result without being played again.
+class FitnessCache:
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self, population: BatchPopulation, seed: int, context: tuple) -> list:
+        state = np.column_stack((population.weights, population.spawn_x, population.y, population.spawn_velocity))
+        return [(row.tobytes(), seed, context) for row in state]
+
+    # Fills score, distance_traveled, gap_closeness and alive of the whole population, play(population) is only
+    # called on the birds that are not cached yet and returns whether their run was cut
+    def evaluate(self, population: BatchPopulation, seed: int, context: tuple, play) -> bool:
+        keys = self.keys(population, seed, context)
+        cached = np.array([key in self.entries for key in keys], dtype=bool)
+        for row in np.flatnonzero(cached):
+            self.entries.move_to_end(keys[row])
+            population.score[row], population.distance_traveled[row], population.gap_closeness[row], \
+                population.alive[row] = self.entries[keys[row]]
+
+        missing = np.flatnonzero(~cached)
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if len(missing) == 0:
+            population.compact()
+            return False
+
+        rows = population.subset(missing)
+        timed_out = play(rows)
+        population.score[missing] = rows.score
+        population.distance_traveled[missing] = rows.distance_traveled
+        population.gap_closeness[missing] = rows.gap_closeness
+        population.x[missing] = rows.x
+        population.velocity[missing] = rows.velocity
+        population.alive[missing] = rows.alive
+        population.compact()
+
+        for row, played in enumerate(missing):
+            self.entries[keys[played]] = (rows.score[row], rows.distance_traveled[row], rows.gap_closeness[row],
+                                          rows.alive[row])
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return timed_out
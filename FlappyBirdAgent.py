@@ -2,26 +2,34 @@
 from typing import Union
 import random
 
+from Controller import Controller, LINEAR
 from GAME_CONSTANTS import SCREEN_HEIGHT, SCREEN_WIDTH, VELOCITY_AFTER_FLAP
 from Perceptron import Perceptron
 from Pipe import Pipe
 
 
 class FlappyBirdAgent:
-    def __init__(self, brain_weights=None):
+    __slots__ = ("x", "y", "velocity", "is_alive", "is_flapping", "brain", "distance_traveled", "score")
 
+    def __init__(self, brain_weights=None, controller: Controller = LINEAR):
+        self.spawn()
+        self.brain = Perceptron(brain_weights, controller)
+
+    # Puts the bird back at a random starting position, used again when an agent is recycled
+    def spawn(self):
         self.x: int = random.randint(SCREEN_HEIGHT // 4, SCREEN_HEIGHT // 2)
         self.y: int = random.randint(SCREEN_WIDTH // 20, SCREEN_WIDTH // 5)
 
         self.velocity: float = random.uniform(-2, 2)
         self.is_alive: bool = True
         self.is_flapping: bool = False
-        self.brain = Perceptron(brain_weights)
         self.distance_traveled: int = 0
         self.score: int = 0
 
     def flap(self):
         self.velocity = VELOCITY_AFTER_FLAP
+        # Read and cleared by the replay recorder
+        self.is_flapping = True
 
     def get_sensors(self, pipes: Union[tuple[Pipe, Pipe], tuple[None, Pipe], tuple[None, None]]) -> tuple[
         int, int, int, int]:
@@ -54,14 +62,7 @@ class FlappyBirdAgent:
 
 
 def set_bird_def(bird: FlappyBirdAgent):
-    bird.is_alive = True
-    bird.is_flapping = False
-
     #Random starting position each generation
-    bird.x = random.randint(SCREEN_HEIGHT // 4, SCREEN_HEIGHT // 2)
-    bird.y = random.randint(SCREEN_WIDTH // 20, SCREEN_WIDTH // 5)
-    bird.velocity = random.uniform(-2, 2)
-    bird.distance_traveled = 0
-    bird.score = 0
+    bird.spawn()
 
     bird.flap()
\ No newline at end of file
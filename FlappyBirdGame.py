@@ -1,15 +1,20 @@
 
 import sys
+from collections import OrderedDict
+from functools import cached_property
 from typing import Union
 
 import pygame
-import random
 import Button
 
+from Assets import load_scaled
 from FlappyBirdAgent import FlappyBirdAgent, set_bird_def
-from GAME_CONSTANTS import SCREEN_WIDTH, SCREEN_HEIGHT, PIPE_WIDTH, BIRD_DIMENSION, GRAVITY, PIPE_SPEED, PIPE_DISTANCE, \
-    PIPE_GAP, set_d_p, ORIGINAL_PIPE_DISTANCE, set_speed, ORIGINAL_PIPE_SPEED
+from Difficulty import CONSTANT, DifficultySchedule
+from GAME_CONSTANTS import SCREEN_WIDTH, SCREEN_HEIGHT, PIPE_WIDTH, BIRD_DIMENSION
+from Instrumentation import NULL_PROFILER
+from Physics import TICK
 from Pipe import Pipe
+from Simulation import Simulation
 
 GAME_RUNNING = 0
 GAME_PAUSE = 1
@@ -19,23 +24,75 @@ GAME_CLOSE = 4
 
 COLOR_BUTTON: tuple[int,int,int] = (255,127,39)
 COLOR_BLACK: tuple[int,int,int] = (0,0,0)
+COLOR_WHITE: tuple[int,int,int] = (255,255,255)
+
+PIPE_CACHE_SIZE = 64
 
 
 def image_color_transparent(path: str, size: float, color:tuple[int,int,int]) -> pygame.Surface:
-    image_full = pygame.transform.scale(pygame.image.load(path),(size, size)).convert_alpha()
+    image_full = load_scaled(path, (size, size)).convert_alpha()
     image_full.set_colorkey(color)
     return image_full
 
+# Every image is decoded the first time it is drawn, a run that never shows it never loads it
 class Images:
-    def __init__(self):
-        self.background = pygame.transform.scale(pygame.image.load("Background.png"), (SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.pipe = pygame.transform.scale(pygame.image.load("Pipe.png"), (PIPE_WIDTH, SCREEN_HEIGHT))
-        self.bird = image_color_transparent("Ryan.png", BIRD_DIMENSION, (255, 0, 0))
-        self.pipe_top = pygame.transform.scale(pygame.image.load("Pipe_TOP.png"), (SCREEN_WIDTH * 1.1, SCREEN_HEIGHT * 0.1))
-        i = pygame.transform.scale(pygame.image.load("FlapyBirdText.png"), (SCREEN_WIDTH * 0.5, SCREEN_HEIGHT * 0.2))
+    @cached_property
+    def background(self) -> pygame.Surface:
+        return load_scaled("Background.png", (SCREEN_WIDTH, SCREEN_HEIGHT)).convert_alpha()
+
+    @cached_property
+    def pipe(self) -> pygame.Surface:
+        return load_scaled("Pipe.png", (PIPE_WIDTH, SCREEN_HEIGHT)).convert_alpha()
+
+    @cached_property
+    def bird(self) -> pygame.Surface:
+        return image_color_transparent("Ryan.png", BIRD_DIMENSION, (255, 0, 0))
+
+    @cached_property
+    def pipe_top(self) -> pygame.Surface:
+        return load_scaled("Pipe_TOP.png", (SCREEN_WIDTH * 1.1, SCREEN_HEIGHT * 0.1)).convert_alpha()
+
+    @cached_property
+    def fb_text(self) -> pygame.Surface:
+        i = load_scaled("FlapyBirdText.png", (SCREEN_WIDTH * 0.5, SCREEN_HEIGHT * 0.2)).convert_alpha()
         i.set_colorkey(COLOR_BLACK)
-        self.fb_text = i
-        self.game_over = pygame.transform.scale(pygame.image.load("GameOverText.png"), (SCREEN_WIDTH * 0.5, SCREEN_HEIGHT * 0.2))
+        return i
+
+    @cached_property
+    def game_over(self) -> pygame.Surface:
+        return load_scaled("GameOverText.png", (SCREEN_WIDTH * 0.5, SCREEN_HEIGHT * 0.2)).convert_alpha()
+
+# Pipe segments stretched to a given height, least recently used heights are dropped first
+class PipeSurfaceCache:
+    def __init__(self, image: pygame.Surface, max_size: int = PIPE_CACHE_SIZE):
+        self.image = image
+        self.max_size = max_size
+        self.surfaces: OrderedDict[int, pygame.Surface] = OrderedDict()
+
+    def get(self, height: int) -> pygame.Surface:
+        surface = self.surfaces.get(height)
+        if surface is None:
+            surface = pygame.transform.scale(self.image, (PIPE_WIDTH, height))
+            self.surfaces[height] = surface
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(height)
+        return surface
+
+# Keeps the last rendered text so it is only rendered again when it changes
+class TextCache:
+    def __init__(self, font: pygame.font.Font, color: tuple[int,int,int]):
+        self.font = font
+        self.color = color
+        self.text = None
+        self.surface = None
+
+    def render(self, text: str) -> pygame.Surface:
+        if text != self.text:
+            self.text = text
+            self.surface = self.font.render(text, True, self.color)
+        return self.surface
 
 class Buttons:
     def __init__(self, screen):
@@ -49,74 +106,106 @@ class Buttons:
                                              "play", COLOR_BUTTON, COLOR_BLACK, 100)
 
 class FlappyBirdGame:
-    def __init__(self, autonomous_mode=False):
+    def __init__(self, autonomous_mode=False, schedule: DifficultySchedule = CONSTANT):
         self.autonomous_mode:bool = autonomous_mode
+        # The schedule makes the game harder as the score goes up, see Difficulty
+        self.simulation = Simulation(schedule=schedule)
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.pipes:list[Pipe] = []
-        self.score = 0
         self.status = GAME_MENU
         self.curr_poz_left = 0
         self.images = Images()
         self.flap_key_pressed:bool = False
-        self.buttons:Buttons = Buttons(self.screen)
-        self.distance = 0
-        self.d_first_pipe = 0
+        # Extra text the training loop shows after "Score | Alive", e.g. the simulation speed
+        self.hud_status: Union[str, None] = None
+        # Screen areas drawn by the last render_game, None means the next update covers the whole screen
+        self.previous_rects: Union[list[pygame.Rect], None] = None
+        self.dirty_rects: Union[list[pygame.Rect], None] = None
+        # Set by the training loop when profiling is on, the overlay shows its live figures
+        self.profiler = NULL_PROFILER
+        self.show_overlay = False
+        self.overlay_text: list[TextCache] = []
+        # Set to a ReplayRecorder to keep the manual games, recording tells whether one is being recorded
+        self.recorder = None
+        self.recording = False
 
         game_reset(self)
 
-    def update_pipes(self):
-        update_done:bool = False
-        l = len(self.pipes)
-        if l == 0:
-            self.pipes.append(self.new_pipe(int(SCREEN_WIDTH * 0.33), PIPE_WIDTH, PIPE_GAP))
-            self.d_first_pipe = self.pipes[0].left_y + self.pipes[0].width
-        while not update_done:
-            ref_poz = 0
-            l = len(self.pipes)
-            if l > 0:
-                ref_poz = self.pipes[0].left_y + self.pipes[0].width
-            if ref_poz < 0:
-                self.pipes.remove(self.pipes[0])
-            elif self.pipes[l-1].left_y + PIPE_DISTANCE <= SCREEN_WIDTH:
-                self.pipes.append(self.new_pipe(self.pipes[l-1].left_y + PIPE_DISTANCE, PIPE_WIDTH, PIPE_GAP))
-            else:
-                update_done = True
-    def new_pipe(self, y:int, pipe_width:int, pipe_gap:int) -> Pipe:
-        up_pipe = random.randint( int(SCREEN_HEIGHT * 0.1), int(SCREEN_HEIGHT * 0.9) - pipe_gap)
-        return Pipe(up_pipe + pipe_gap, up_pipe, pipe_width, y)
-    def update_physics(self, bird: FlappyBirdAgent):
-        bird.velocity += GRAVITY
-        bird.x += bird.velocity
+    # Buttons, fonts and pipe segments are only built once something draws them
+    @cached_property
+    def buttons(self) -> Buttons:
+        return Buttons(self.screen)
+
+    @cached_property
+    def pipe_surfaces(self) -> PipeSurfaceCache:
+        return PipeSurfaceCache(self.images.pipe)
+
+    @cached_property
+    def hud_text(self) -> TextCache:
+        return TextCache(pygame.font.SysFont("Arial", 48, bold=True), COLOR_WHITE)
+
+    @cached_property
+    def score_text(self) -> TextCache:
+        return TextCache(pygame.font.SysFont("Arial", 64, bold=True), COLOR_WHITE)
+
+    @cached_property
+    def overlay_font(self) -> pygame.font.Font:
+        return pygame.font.SysFont("Arial", 18)
+
+    # Game rules live in Simulation, the properties below keep the old attribute access working
+    @property
+    def pipes(self) -> list[Pipe]:
+        return self.simulation.pipes
+
+    @property
+    def score(self) -> int:
+        return self.simulation.score
 
-        if bird.x + BIRD_DIMENSION > SCREEN_HEIGHT or bird.x < 0:  # Assuming 50 is ground level
-            bird.is_alive = False
+    @score.setter
+    def score(self, score: int):
+        self.simulation.score = score
 
+    @property
+    def distance(self) -> int:
+        return self.simulation.distance
 
+    @distance.setter
+    def distance(self, distance: int):
+        self.simulation.distance = distance
+
+    @property
+    def d_first_pipe(self) -> int:
+        return self.simulation.d_first_pipe
+
+    @d_first_pipe.setter
+    def d_first_pipe(self, d_first_pipe: int):
+        self.simulation.d_first_pipe = d_first_pipe
+
+    def update_pipes(self):
+        self.simulation.update_pipes()
+    def update_physics(self, bird: FlappyBirdAgent):
+        self.simulation.update_physics(bird)
     def check_collision(self, bird: FlappyBirdAgent) -> bool:
-        for pipe in self.pipes:
-            if pipe.collides_with(bird.x, bird.y, BIRD_DIMENSION):
-                return True
-        return False
+        return self.simulation.check_collision(bird)
     def update_game_state(self, birds: list[FlappyBirdAgent]):
 
-        self.distance += PIPE_SPEED
-        self.score = max(int(((self.distance - self.d_first_pipe + SCREEN_WIDTH * 0.33) / PIPE_DISTANCE)), 0)
-        for bird in birds:
-            if bird.is_alive:
-                bird.score = self.score
+        with self.profiler.phase("events"):
+            pygame.event.pump()
 
-        pygame.event.pump()
-        self.update_pipes()
-        for pipe in self.pipes:
-            pipe.left_y -= PIPE_SPEED
-        for bird in birds:
-            self.update_physics(bird)
+        recording = self.recorder is not None and not self.autonomous_mode
+        if recording:
+            if not self.recording:
+                self.recorder.begin_agents(birds, self.simulation, TICK)
+                self.recording = True
+            alive = [i for i, bird in enumerate(birds) if bird.is_alive]
+            flapped = [i for i in alive if birds[i].is_flapping]
+            for bird in birds:
+                bird.is_flapping = False
 
-            if bird.x + BIRD_DIMENSION > SCREEN_HEIGHT or bird.x < 0:
-                bird.is_alive = False
+        with self.profiler.phase("simulation"):
+            self.simulation.step(birds, self.profiler)
 
-            if self.check_collision(bird):
-                bird.is_alive = False
+        if recording:
+            self.recorder.observe_agents(alive, flapped, birds)
 
         if not self.autonomous_mode:
             no_bird_live = True
@@ -124,6 +213,9 @@ class FlappyBirdGame:
                 if bird.is_alive:
                     no_bird_live = False
             if no_bird_live:
+                if recording:
+                    self.recorder.end_game(birds)
+                    self.recording = False
                 self.reset_game_state_birds(birds)
                 self.status = GAME_MENU
 
@@ -140,9 +232,13 @@ class FlappyBirdGame:
             raise NotImplementedError
         pass
     def renter_game_over(self):
+        self.previous_rects = None
+        self.dirty_rects = None
         self.screen.blit(self.images.game_over, (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2))
         pass
     def render_menu(self):
+        self.previous_rects = None
+        self.dirty_rects = None
         self.screen.blit(self.images.fb_text, (SCREEN_WIDTH * 0.25, SCREEN_HEIGHT * 0.25))
         self.buttons.auto_mode.draw()
         self.buttons.manual_mode.draw()
@@ -150,37 +246,71 @@ class FlappyBirdGame:
         pass
 
     def render_game(self, birds: list[FlappyBirdAgent]):
-        self.screen.blit(self.images.background, (0, 0))
+        # Only what moved since the last frame is painted over with the background
+        if self.previous_rects is None:
+            self.screen.blit(self.images.background, (0, 0))
+            self.dirty_rects = None
+        else:
+            for rect in self.previous_rects:
+                self.screen.blit(self.images.background, rect, rect)
+            self.dirty_rects = list(self.previous_rects)
 
+        drawn: list[pygame.Rect] = []
         for pipe in self.pipes:
-            self.screen.blit(pygame.transform.scale(self.images.pipe, (PIPE_WIDTH, pipe.left_up)),
-                             (pipe.left_y, 0))
-            self.screen.blit(pygame.transform.scale(self.images.pipe, (PIPE_WIDTH, SCREEN_HEIGHT - pipe.left_down)),
-                             (pipe.left_y, pipe.left_down))
+            drawn.append(self.screen.blit(self.pipe_surfaces.get(pipe.left_up), (pipe.left_y, 0)))
+            drawn.append(self.screen.blit(self.pipe_surfaces.get(SCREEN_HEIGHT - pipe.left_down),
+                                          (pipe.left_y, pipe.left_down)))
 
         for bird in birds:
             if bird.is_alive:  # Only draw alive birds
-                self.screen.blit(self.images.bird, (bird.y, bird.x))
+                drawn.append(self.screen.blit(self.images.bird, (bird.y, bird.x)))
 
         if self.autonomous_mode:
-            font = pygame.font.SysFont("Arial", 48, bold=True)
             alive_count = len([b for b in birds if b.is_alive])
-
-            score_text = font.render(f"Score: {self.score} | Alive: {alive_count}/{len(birds)}",
-                                     True, (255, 255, 255))
+            hud = f"Score: {self.score} | Alive: {alive_count}/{len(birds)}"
+            if self.hud_status is not None:
+                hud += f" | {self.hud_status}"
+            score_text = self.hud_text.render(hud)
 
             text_rect = score_text.get_rect()
             text_rect.topleft = (10, 10)
-            pygame.draw.rect(self.screen, (0, 0, 0), text_rect.inflate(20, 10))
+            drawn.append(pygame.draw.rect(self.screen, COLOR_BLACK, text_rect.inflate(20, 10)))
 
             self.screen.blit(score_text, (20, 15))
         else:
-            font = pygame.font.SysFont("Arial", 64, bold=True)
-            score_text = font.render(f"{self.score}", True, (255, 255, 255))
+            score_text = self.score_text.render(f"{self.score}")
             text_rect = score_text.get_rect(center=(SCREEN_WIDTH // 2, 100))
 
-            pygame.draw.rect(self.screen, (0, 0, 0), text_rect.inflate(20, 10))
+            drawn.append(pygame.draw.rect(self.screen, COLOR_BLACK, text_rect.inflate(20, 10)))
             self.screen.blit(score_text, text_rect)
+
+        if self.show_overlay:
+            self.render_overlay(drawn)
+
+        if self.dirty_rects is not None:
+            self.dirty_rects.extend(drawn)
+        self.previous_rects = drawn
+
+    # Profiler figures of the running generation, one line each under the HUD
+    def render_overlay(self, drawn: list[pygame.Rect]):
+        lines = self.profiler.overlay_lines()
+        while len(self.overlay_text) < len(lines):
+            self.overlay_text.append(TextCache(self.overlay_font, COLOR_WHITE))
+
+        top = 80
+        for text, line in zip(self.overlay_text, lines):
+            surface = text.render(line)
+            rect = surface.get_rect(topleft=(20, top))
+            drawn.append(pygame.draw.rect(self.screen, COLOR_BLACK, rect.inflate(10, 4)))
+            self.screen.blit(surface, rect)
+            top += rect.height + 4
+
+    # Pushes the frame to the window, only the dirty areas while the game is running
+    def present(self):
+        if self.dirty_rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(self.dirty_rects)
     def manual_input(self, bird):
 
         for event in pygame.event.get():
@@ -219,51 +349,13 @@ class FlappyBirdGame:
             self.status = GAME_CLOSE
         pass
     def get_closest_pipes(self, poz_y: int) -> Union[tuple[Pipe, Pipe], tuple[None, Pipe]]:
-        l = len(self.pipes)
-
-        # No pipes yet
-        if l == 0:
-            return None, None
-
-        # Only one pipe
-        if l == 1:
-            return None, self.pipes[0]
-
-        # Bird is before the first pipe
-        if poz_y < self.pipes[0].left_y:
-            return None, self.pipes[0]
-
-        # Check between pipes
-        for i in range(l - 1):
-            pipe_current = self.pipes[i]
-            pipe_next = self.pipes[i + 1]
-
-            # Bird is between pipe i and pipe i+1
-            if pipe_current.left_y <= poz_y < pipe_next.left_y:
-                # Check if bird has passed pipe_current (cleared it)
-                if poz_y >= pipe_current.left_y + pipe_current.width:
-                    # Bird is in the gap between pipes
-                    return None, pipe_next
-                else:
-                    # Bird is still inside/approaching pipe_current
-                    return pipe_current, pipe_next
-
-        # Bird is past all pipes but the last one .This means bird is at or past the last pipe
-
-        last_pipe = self.pipes[l - 1]
-        if poz_y >= last_pipe.left_y:
-            if poz_y >= last_pipe.left_y + last_pipe.width:
-                # Bird passed the last pipe - return None for both (needs new pipe)
-                return None, last_pipe
-            else:
-                # Bird is going through the last pipe
-                return last_pipe, last_pipe
-
-        return None, self.pipes[0]
+        return self.simulation.get_closest_pipes(poz_y)
 
     def reset_game_state(self, bird: FlappyBirdAgent):
         set_bird_def(bird)
         game_reset(self)
+        # A game restarted half way is not kept
+        self.recording = False
         pass
     def reset_game_state_birds(self, birds: list[FlappyBirdAgent]):
         for bird in birds:
@@ -284,26 +376,16 @@ class FlappyBirdGame:
         if self.status == GAME_RUNNING and not self.autonomous_mode and not bird.is_alive:
             self.status = GAME_GAME_OVER
 
-        if self.status in (GAME_RUNNING, GAME_MENU, GAME_GAME_OVER):
-            self.render([bird])
+        with self.profiler.phase("render"):
+            if self.status in (GAME_RUNNING, GAME_MENU, GAME_GAME_OVER):
+                self.render([bird])
 
-        pygame.display.update()
+            self.present()
         clock.tick(FPS)
-    def increase_dificulty(self):
-        if self.score >= 3:
-            set_d_p(ORIGINAL_PIPE_DISTANCE - 20)
-        if self.score >= 6:
-            set_d_p(ORIGINAL_PIPE_DISTANCE - 20)
-        if self.score >= 9:
-            set_speed(ORIGINAL_PIPE_SPEED + 2)
-            pass
 
 
 def game_reset(game: FlappyBirdGame):
-    game.pipes = []
-    game.score = 0
+    game.simulation.reset()
 
     game.status = GAME_MENU
-    game.curr_poz_left = 0
-    game.distance = 0
-    game.d_first_pipe = 0
\ No newline at end of file
+    game.curr_poz_left = 0
\ No newline at end of file
@@ -13,12 +13,10 @@ BIRD_DIMENSION = 50
 FLAP_DISTANCE = 50
 VELOCITY_AFTER_FLAP = -7
 
-def set_d_p(d_p:int):
-    global PIPE_DISTANCE
-    PIPE_DISTANCE = d_p
-
-def set_speed(speed:int):
-    global PIPE_SPEED
-    PIPE_SPEED = speed
+MAX_GENERATION_FRAMES = 5000
+MAX_GENERATION_SCORE = 30
+# Steps without any bird dying after which a generation is ended early, 0 never ends it early
+STALL_FRAMES = 0
+DISTANCE_TARGET = 20000
 
 
@@ -1,7 +1,16 @@
 
-import random
+import numpy as np
 
-from FlappyBirdAgent import FlappyBirdAgent
+from AgentPool import AgentPool
+from BatchPopulation import BatchPopulation
+from Controller import Controller, LINEAR
+from Fitness import fitness as bird_fitness
+from Instrumentation import NULL_PROFILER
+from Speciation import assign_species
+
+SPECIATION_THRESHOLD = 0.8
+MUTATION_RATE = 0.15
+MUTATION_AMOUNT = 0.05
 
 
 class Species:
@@ -10,6 +19,8 @@ class Species:
     def __init__(self, representative):
         self.representative = representative
         self.birds = [representative]
+        # Positions of the birds in the speciated population, kept in the same order as self.birds
+        self.indices = None
         self.average_fitness = 0
 
     def add_bird(self, bird):
@@ -30,53 +41,86 @@ class Species:
 
 
 class GeneticAlgorithm:
-    def __init__(self, population_size=100):
+    def __init__(self, population_size=100, seed=None, controller: Controller = LINEAR):
         self.population_size = population_size
         self.current_generation = 0
-        self.initial_population = self._spawn_initial_population(population_size)
-
-    def _spawn_initial_population(self, N):
-
-        birds = []
-        for i in range(N):
-            birds.append(FlappyBirdAgent())
-        return birds
+        self.controller = controller
+        # SPECIATION_THRESHOLD is the L1 distance between two 4 weight brains, longer parameter vectors
+        # get the same distance per parameter
+        self.speciation_threshold = SPECIATION_THRESHOLD * controller.parameter_count / LINEAR.parameter_count
+        # Every random draw of the algorithm (initial brains, parent choice, mutation) comes from this generator
+        self.rng = np.random.default_rng(seed)
+        self.pool = AgentPool(population_size, self.rng, controller)
+        self.initial_population = self.pool.agents
+        # Weight matrix the last speciate call grouped, species.indices point into its rows
+        self.speciated_weights = self.pool.weights
+        # Species of every bird of the last generation next_generation bred from, and the row of that generation
+        # every new bird comes from (-1 for fresh random brains), for whoever tracks birds across generations.
+        # clones marks the species champions copied without mutation.
+        self.species_of = None
+        self.species_count = 0
+        self.parents = None
+        self.clones = None
+        # Best bird seen over the whole run, kept apart because the pool rows get overwritten every generation
+        self.best_weights = None
+        self.best_score = -1
+
+    # The pool's weights live in buffer from now on (shared memory, see SharedPopulation), next_generation
+    # breeds straight into it
+    def rebind_weights(self, buffer: np.ndarray):
+        self.pool.rebind(buffer)
+        self.speciated_weights = self.pool.weights
+
+    # scores are in pool order, one per row of self.pool.weights. rows, when given, are the only birds that may
+    # become the champion (the curriculum's last tier, where scores mean the full game).
+    def track_champion(self, scores, rows=None):
+        if rows is not None:
+            if len(rows) == 0:
+                return
+            rows = np.asarray(rows)
+            best = int(rows[np.argmax(np.asarray(scores)[rows])])
+        else:
+            best = int(np.argmax(scores))
+        if scores[best] > self.best_score:
+            self.best_score = int(scores[best])
+            self.best_weights = self.pool.weights[best].tolist()
 
     def speciate(self, birds):
 
-        species_list = []
-        speciation_threshold = 0.8
-
-        for bird in birds:
-            added_to_species = False
-
-            for species in species_list:
-
-                weight_difference = sum(
-                    abs(w_bird - w_rep)
-                    for w_bird, w_rep in zip(bird.brain.weights, species.representative.brain.weights)
-                )
-
-                if weight_difference < speciation_threshold:
-                    species.add_bird(bird)
-                    added_to_species = True
-                    break
+        if birds is self.pool.agents:
+            weights = self.pool.weights
+        else:
+            weights = np.array([bird.brain.weights for bird in birds], dtype=np.float64)
+        self.speciated_weights = weights
+        species_of, representatives = assign_species(weights, self.speciation_threshold)
 
-            if not added_to_species:
-                new_species = Species(bird)
-                species_list.append(new_species)
+        # Members of every species in bird order, the representative is always the first of them
+        species_list = []
+        for members in self._split_species(species_of, len(representatives), np.argsort(species_of, kind="stable")):
+            species = Species(birds[members[0]])
+            species.birds = list(map(birds.__getitem__, members.tolist()))
+            species.indices = members
+            species_list.append(species)
 
         return species_list
 
+    # Ranks on Fitness.fitness like next_generation. Agents do not record gap closeness, so it counts as 0 here.
     def calculate_fitness(self, species_list):
 
+        birds = [bird for species in species_list for bird in species.birds]
+        values = bird_fitness(BatchPopulation.from_agents(birds)).tolist() if birds else []
+        start = 0
         for species in species_list:
+            species_fitness = values[start:start + len(species.birds)]
+            start += len(species.birds)
             if len(species.birds) > 0:
-                total_fitness = sum(bird.distance_traveled for bird in species.birds)
-                species.average_fitness = total_fitness / len(species.birds)
+                species.average_fitness = sum(species_fitness) / len(species.birds)
             else:
                 species.average_fitness = 0
-            species.birds.sort(key=lambda bird: bird.distance_traveled, reverse=True)
+            order = sorted(range(len(species.birds)), key=lambda i: species_fitness[i], reverse=True)
+            species.birds = [species.birds[i] for i in order]
+            if species.indices is not None:
+                species.indices = species.indices[order]
 
         species_list.sort(key=lambda species: species.average_fitness, reverse=True)
 
@@ -84,54 +128,90 @@ class GeneticAlgorithm:
 
     def create_next_generation(self, sorted_species):
 
-        new_population = []
-        total_average_fitness = sum(species.average_fitness for species in sorted_species)
+        parents, clones = self._offspring_plan([species.indices for species in sorted_species],
+                                               [species.average_fitness for species in sorted_species])
+        weights = self.breed(self.speciated_weights, parents, clones)
 
-        for species in sorted_species:
-            if len(species.birds) == 0:
-                continue
+        self.current_generation += 1
+        return self.pool.assign(weights)
+
+    # Same selection as speciate + calculate_fitness + create_next_generation, but on arrays only:
+    # fitness holds one value per row of self.pool.weights and the new generation is written back into them
+    def next_generation(self, fitness, profiler=NULL_PROFILER) -> np.ndarray:
+        fitness = np.asarray(fitness, dtype=np.float64)
+        weights = self.pool.weights
+        with profiler.phase("speciation"):
+            species_of, representatives = assign_species(weights, self.speciation_threshold)
+        self.species_of = species_of
+        species_count = self.species_count = len(representatives)
+        profiler.count("species", species_count)
+
+        with profiler.phase("reproduction"):
+            self._reproduce(weights, fitness, species_of, species_count)
 
-            champion = species.birds[0]
-            champion_clone = FlappyBirdAgent(brain_weights=champion.brain.weights.copy())
-            new_population.append(champion_clone)
+        self.current_generation += 1
+        return self.pool.weights
+
+    def _reproduce(self, weights, fitness, species_of, species_count):
+        # Sorted by species, then best fitness first, ties keep bird order
+        order = np.lexsort((-fitness, species_of))
+        members = self._split_species(species_of, species_count, order)
+        average_fitness = np.bincount(species_of, weights=fitness, minlength=species_count) / \
+            np.bincount(species_of, minlength=species_count)
+        ranking = np.argsort(-average_fitness, kind="stable")
+
+        parents, clones = self._offspring_plan([members[i] for i in ranking], average_fitness[ranking].tolist())
+        self.pool.weights[:] = self.breed(weights, parents, clones)
+
+    @staticmethod
+    def _split_species(species_of, species_count, order):
+        ends = np.cumsum(np.bincount(species_of, minlength=species_count))
+        return np.split(order, ends[:-1])
+
+    # Rows of the speciated weights every child is copied from. Each species gets its champion unchanged
+    # followed by mutated children of random members, clones marks the champions.
+    def _offspring_plan(self, species_members, species_fitness):
+        total_average_fitness = sum(species_fitness)
+        parents = []
+        counts = []
+
+        for members, average_fitness in zip(species_members, species_fitness):
+            if len(members) == 0:
+                continue
 
             if total_average_fitness > 0:
-                species_offspring_count = int(
-                    (species.average_fitness / total_average_fitness) * self.population_size
-                )
+                species_offspring_count = int((average_fitness / total_average_fitness) * self.population_size)
             else:
-                species_offspring_count = max(2, self.population_size // len(sorted_species))
+                species_offspring_count = max(2, self.population_size // len(species_members))
 
             species_offspring_count = max(1, species_offspring_count)
 
-            for _ in range(species_offspring_count - 1):
-
-                parent = random.choice(species.birds)
-                child_weights = parent.brain.weights.copy()
-                mutated_weights = self.mutate_weights(child_weights)
-
-                child = FlappyBirdAgent(brain_weights=mutated_weights)
-                new_population.append(child)
-
-        while len(new_population) < self.population_size:
-            new_population.append(FlappyBirdAgent())
-
-        new_population = new_population[:self.population_size]
-
-        self.current_generation += 1
-        return new_population
-
-    def mutate_weights(self, weights):
-
-        mutation_rate = 0.15
-        mutation_amount = 0.05
-
-        new_weights = []
-        for w in weights:
-            if random.random() < mutation_rate:
-                mutation = random.uniform(-mutation_amount, mutation_amount)
-                w += mutation
-                w = max(-1.0, min(1.0, w))
-            new_weights.append(w)
-
-        return new_weights
\ No newline at end of file
+            parents.append(members[:1])
+            parents.append(members[self.rng.integers(0, len(members), species_offspring_count - 1)])
+            counts.append(species_offspring_count)
+
+        parents = np.concatenate(parents)[:self.population_size]
+        clones = np.zeros(len(parents), dtype=bool)
+        champions = np.cumsum([0] + counts[:-1])
+        clones[champions[champions < len(parents)]] = True
+        return parents, clones
+
+    # Whole next generation in one pass: gather the parents, mutate through a mask, clip once.
+    # Slots left over after all species had their share get fresh random brains.
+    def breed(self, weights, parents, clones) -> np.ndarray:
+        children = np.empty((self.population_size, weights.shape[1]))
+        count = len(parents)
+
+        bred = children[:count]
+        np.take(weights, parents, axis=0, out=bred)
+        mutation = self.rng.random(bred.shape) < MUTATION_RATE
+        mutation[clones] = False
+        bred += mutation * self.rng.uniform(-MUTATION_AMOUNT, MUTATION_AMOUNT, bred.shape)
+        np.clip(bred, -1.0, 1.0, out=bred)
+
+        children[count:] = self.pool.random_weights(self.population_size - count)
+        self.parents = np.full(self.population_size, -1, dtype=np.int64)
+        self.parents[:count] = parents
+        self.clones = np.zeros(self.population_size, dtype=bool)
+        self.clones[:count] = clones
+        return children
@@ -0,0 +1,146 @@
+import json
+import math
+import time
+from collections import defaultdict
+from typing import Union
+
+# Bucket i counts durations below 2**i microseconds (and at least 2**(i-1)), the last one takes everything longer
+HISTOGRAM_BUCKETS = 32
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "maximum")
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float):
+        microseconds = seconds * 1e6
+        index = min(math.frexp(microseconds)[1], HISTOGRAM_BUCKETS - 1) if microseconds >= 1 else 0
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    # Upper bound of the bucket holding the q quantile, in seconds
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(2 ** index / 1e6, self.maximum)
+        return self.maximum
+
+    def to_dict(self) -> dict:
+        used = max((i + 1 for i, count in enumerate(self.buckets) if count), default=0)
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99), "max": self.maximum,
+                "buckets_us_log2": self.buckets[:used]}
+
+
+# Context manager timing one phase. One instance per phase name, so a phase must not be nested in itself.
+class _Phase:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self):
+        self.histogram = Histogram()
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.record(time.perf_counter() - self.start)
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+# Phase timers, counters and a per-generation JSON lines log. The game code wraps its phases in
+# `with profiler.phase(name):` and counts events with profiler.count, whether profiling is on or not.
+class Profiler:
+    enabled = True
+
+    def __init__(self, log_path: str = None):
+        self.log = open(log_path, "a") if log_path else None
+        self.counters: defaultdict[str, int] = defaultdict(int)
+        self.phases: dict[str, _Phase] = {}
+        self.last_record: Union[dict, None] = None
+        self.generation_start = time.perf_counter()
+
+    def phase(self, name: str) -> _Phase:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase()
+        return phase
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    # Closes the figures of a generation, writes them to the log and starts over
+    def end_generation(self, generation: int, **stats) -> dict:
+        now = time.perf_counter()
+        record = {"generation": generation, "seconds": now - self.generation_start, **stats,
+                  "counters": dict(self.counters),
+                  "phases": {name: phase.histogram.to_dict() for name, phase in self.phases.items()}}
+        if self.log is not None:
+            self.log.write(json.dumps(record) + "\n")
+            self.log.flush()
+
+        self.last_record = record
+        self.counters.clear()
+        self.phases.clear()
+        self.generation_start = now
+        return record
+
+    # Figures of the generation running right now, for the on-screen overlay
+    def overlay_lines(self) -> list[str]:
+        lines = [" ".join(f"{name}: {value}" for name, value in sorted(self.counters.items()))]
+        for name, phase in sorted(self.phases.items(), key=lambda item: -item[1].histogram.total):
+            histogram = phase.histogram
+            lines.append(f"{name}: {histogram.total * 1000:.0f} ms, "
+                         f"p50 {histogram.quantile(0.5) * 1e6:.0f} us, p99 {histogram.quantile(0.99) * 1e6:.0f} us")
+        return lines
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+# Stand-in used when profiling is off: phases and counters do nothing
+class NullProfiler:
+    enabled = False
+    _phase = _NullPhase()
+
+    def phase(self, name: str) -> _NullPhase:
+        return self._phase
+
+    def count(self, name: str, amount: int = 1):
+        pass
+
+    def end_generation(self, generation: int, **stats):
+        return None
+
+    def overlay_lines(self) -> list[str]:
+        return []
+
+    def close(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
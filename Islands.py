@@ -0,0 +1,185 @@
+import multiprocessing
+import queue
+from collections import deque
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation, run_generation
+from Controller import Controller, LINEAR
+from Difficulty import CONSTANT, DifficultySchedule
+from Fitness import fitness
+from GAME_CONSTANTS import MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE, STALL_FRAMES
+from GeneticAlgorithm import GeneticAlgorithm
+from Physics import FixedTimestep, TICK
+from Simulation import Simulation
+
+MIGRATION_INTERVAL = 5
+MIGRANTS = 2
+
+
+# Everything an island needs to run on its own, the same for all islands of a run
+class IslandConfig:
+    def __init__(self, islands: int, population_size: int, generations: int, seed: int,
+                 interval: int = MIGRATION_INTERVAL, migrants: int = MIGRANTS, controller: Controller = LINEAR,
+                 schedule: DifficultySchedule = CONSTANT, timestep: FixedTimestep = TICK,
+                 stall_frames=STALL_FRAMES, max_frames=MAX_GENERATION_FRAMES, max_score=MAX_GENERATION_SCORE):
+        self.islands = islands
+        self.population_size = population_size
+        self.generations = generations
+        self.seed = seed
+        self.interval = interval
+        self.migrants = migrants
+        self.controller = controller
+        self.schedule = schedule
+        self.timestep = timestep
+        self.stall_frames = stall_frames
+        self.max_frames = max_frames
+        self.max_score = max_score
+
+
+# Islands are arranged in a ring, the elites of island i go to island i + 1. send never waits
+# and receive only takes what already arrived, so no island ever waits for another.
+# LocalTransport keeps the messages in the process, for islands stepped one after the other.
+class LocalTransport:
+    def __init__(self, islands: int):
+        self.inboxes = [deque() for _ in range(islands)]
+
+    def send(self, source: int, weights: np.ndarray):
+        self.inboxes[(source + 1) % len(self.inboxes)].append(weights)
+
+    def receive(self, island: int) -> list[np.ndarray]:
+        inbox = self.inboxes[island]
+        received = list(inbox)
+        inbox.clear()
+        return received
+
+    def close(self, island: int):
+        pass
+
+
+# Same ring between processes, over one multiprocessing queue per island
+class QueueTransport:
+    def __init__(self, islands: int, context=multiprocessing):
+        self.inboxes = [context.Queue() for _ in range(islands)]
+
+    def send(self, source: int, weights: np.ndarray):
+        self.inboxes[(source + 1) % len(self.inboxes)].put(weights)
+
+    def receive(self, island: int) -> list[np.ndarray]:
+        received = []
+        while True:
+            try:
+                received.append(self.inboxes[island].get_nowait())
+            except queue.Empty:
+                return received
+
+    def close(self, island: int):
+        # Elites sent after the neighbour's last generation are never read, they must not keep the process alive
+        for inbox in self.inboxes:
+            inbox.cancel_join_thread()
+
+
+# One population with its own genetic algorithm, speciation and course simulation
+class Island:
+    def __init__(self, index: int, config: IslandConfig, transport):
+        self.index = index
+        self.config = config
+        self.transport = transport
+        seed = np.random.SeedSequence(config.seed).spawn(config.islands)[index]
+        self.ga = GeneticAlgorithm(config.population_size, seed, config.controller)
+        self.simulation = Simulation(schedule=config.schedule)
+        self.immigrants = 0
+
+    @property
+    def generation(self) -> int:
+        return self.ga.current_generation
+
+    # Plays one generation and breeds the next, returns what the island reports about it
+    def step(self) -> dict:
+        config = self.config
+        ga = self.ga
+        generation = ga.current_generation
+        population = BatchPopulation.spawn(ga.pool.weights, ga.rng, config.controller)
+        # Every island plays the same course in a generation, so the islands' scores can be compared
+        run_generation(population, self.simulation, config.max_frames, config.max_score, config.seed + generation,
+                       stall_frames=config.stall_frames, timestep=config.timestep)
+        scores = fitness(population)
+        ga.track_champion(population.score)
+
+        if config.interval > 0 and (generation + 1) % config.interval == 0:
+            elites = np.argsort(-scores, kind="stable")[:config.migrants]
+            self.transport.send(self.index, ga.pool.weights[elites].copy())
+
+        ga.next_generation(scores)
+        self.take_immigrants()
+        return {"island": self.index, "generation": generation, "best_score": int(population.score.max()),
+                "best_fitness": float(scores.max()), "mean_fitness": float(scores.mean())}
+
+    # Immigrants replace bred children picked at random, the species champions are always kept
+    def take_immigrants(self):
+        received = self.transport.receive(self.index)
+        if not received:
+            return
+        immigrants = np.concatenate(received)
+        candidates = np.flatnonzero(~self.ga.clones)
+        count = min(len(immigrants), len(candidates))
+        rows = self.ga.rng.choice(candidates, count, replace=False)
+        self.ga.pool.weights[rows] = immigrants[:count]
+        self.immigrants += count
+
+    def result(self) -> dict:
+        return {"island": self.index, "best_score": self.ga.best_score, "best_weights": self.ga.best_weights,
+                "immigrants": self.immigrants}
+
+
+# Process entry point, reports every generation and finally the island's result on `reports`
+def island_main(index: int, config: IslandConfig, transport: QueueTransport, reports):
+    island = Island(index, config, transport)
+    while island.generation < config.generations:
+        reports.put(("generation", island.step()))
+    transport.close(index)
+    reports.put(("done", island.result()))
+
+
+# All islands in this process, one generation of every island after the other. Deterministic, for tests
+# and machines with a single core.
+def run_islands_locally(config: IslandConfig, report=print) -> list[dict]:
+    transport = LocalTransport(config.islands)
+    islands = [Island(index, config, transport) for index in range(config.islands)]
+    for _ in range(config.generations):
+        for island in islands:
+            report(island.step())
+    return [island.result() for island in islands]
+
+
+# Every island in its own process. Returns the islands' results once all of them are done.
+def run_islands(config: IslandConfig, report=print) -> list[dict]:
+    context = multiprocessing.get_context()
+    transport = QueueTransport(config.islands, context)
+    reports = context.Queue()
+    processes = [context.Process(target=island_main, args=(index, config, transport, reports), daemon=True)
+                 for index in range(config.islands)]
+    for process in processes:
+        process.start()
+
+    results = []
+    try:
+        while len(results) < config.islands:
+            try:
+                kind, message = reports.get(timeout=1)
+            except queue.Empty:
+                # An island that died never reports again
+                failed = [process.exitcode for process in processes if process.exitcode not in (None, 0)]
+                if failed:
+                    raise RuntimeError(f"an island process exited with code {failed[0]}")
+                continue
+            if kind == "done":
+                results.append(message)
+            else:
+                report(message)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    return sorted(results, key=lambda result: result["island"])
@@ -0,0 +1,147 @@
+import json
+import queue
+import threading
+import time
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+from GAME_CONSTANTS import MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE
+from Physics import FixedTimestep, TICK
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Distances are counted in bins of DISTANCE_BIN pixels, the last bin takes everything further
+DISTANCE_BIN = 10
+DISTANCE_BINS = 4096
+# Birds alive are sampled every SURVIVAL_INTERVAL ticks
+SURVIVAL_INTERVAL = 50
+# Records waiting for the writer thread. When it falls that far behind, records are dropped, never the game slowed.
+WRITER_CAPACITY = 1024
+
+
+# Running count, sum, max and binned counts of one value, enough for quantiles without keeping the values.
+# Memory is the fixed number of bins whatever the number of birds.
+class BinnedAggregate:
+    def __init__(self, bin_width: float, bins: int):
+        self.bin_width = bin_width
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.maximum = max(self.maximum, float(values.max()))
+        bins = np.minimum((values // self.bin_width).astype(np.int64), len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    # Lower edge of the bin holding the q quantile, exact for whole numbers counted in bins of 1
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q * self.count))
+        return float(min(index * self.bin_width, self.maximum))
+
+    def to_dict(self) -> dict:
+        return {"max": self.maximum, "mean": self.total / self.count if self.count else 0.0,
+                **{f"p{round(q * 100)}": self.quantile(q) for q in QUANTILES}}
+
+    def clear(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+
+# Per-generation figures updated while the generation is stepped: every bird is counted once, the step it dies,
+# and the survivors once at the end, so closing a generation never goes over the whole population again.
+# begin starts a generation, observe follows its steps (run_generation calls it) and finish closes it.
+# Populations played elsewhere (parallel workers, curriculum tiers) skip observe and are counted in one go by finish.
+class GenerationMetrics:
+    def __init__(self, writer: "MetricsWriter" = None):
+        self.writer = writer
+        self.score = BinnedAggregate(1, MAX_GENERATION_SCORE + 1)
+        self.distance = BinnedAggregate(DISTANCE_BIN, DISTANCE_BINS)
+        self.survival = np.zeros(MAX_GENERATION_FRAMES // SURVIVAL_INTERVAL + 1, dtype=np.int64)
+        self.begin()
+
+    def begin(self, timestep: FixedTimestep = TICK):
+        self.score.clear()
+        self.distance.clear()
+        self.dt = timestep.dt
+        self.steps = 0
+        self.frames = 0.0
+        # survival[k] is the number of birds alive after k * SURVIVAL_INTERVAL ticks
+        self.samples = 1
+        self.start = time.perf_counter()
+
+    # Called after every step of the generation
+    def observe(self, population: BatchPopulation):
+        rows = population.last_decision[0]
+        survivors = population.live_rows
+        if len(survivors) < len(rows):
+            # Dead birds keep their score and distance from here on
+            dead = np.setdiff1d(rows, survivors, assume_unique=True)
+            self.score.add(population.score[dead])
+            self.distance.add(population.distance_traveled[dead])
+
+        self.steps += 1
+        self.frames += self.dt
+        while self.samples < len(self.survival) and self.samples * SURVIVAL_INTERVAL <= self.frames:
+            self.survival[self.samples] = len(survivors)
+            self.samples += 1
+
+    # Counts the birds not counted yet and returns the generation's figures
+    def finish(self, population: BatchPopulation) -> dict:
+        rows = population.live_rows if self.steps else slice(None)
+        self.score.add(population.score[rows])
+        self.distance.add(population.distance_traveled[rows])
+        seconds = time.perf_counter() - self.start
+        self.survival[0] = len(population)
+        return {"birds": len(population), "score": self.score.to_dict(), "distance": self.distance.to_dict(),
+                "survival_interval": SURVIVAL_INTERVAL, "survival": self.survival[:self.samples].tolist(),
+                "steps": self.steps, "steps_per_second": self.steps / seconds if seconds > 0 else 0.0}
+
+    def write(self, generation: int, summary: dict, **extra):
+        if self.writer is not None:
+            self.writer.write({"generation": generation, **summary, **extra})
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+# Appends records to a JSON lines file from a background thread, write only queues them
+class MetricsWriter:
+    def __init__(self, path: str, capacity: int = WRITER_CAPACITY):
+        self.path = path
+        self.queue = queue.Queue(capacity)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        with open(self.path, "a") as file:
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    return
+                file.write(json.dumps(record) + "\n")
+                # Flushed whenever the writer catches up, not once per record
+                if self.queue.empty():
+                    file.flush()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.dropped:
+            print(f"Metrics: {self.dropped} records dropped, the writer could not keep up")
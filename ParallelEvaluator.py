@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation, run_generation
+from Controller import Controller
+from Difficulty import CONSTANT, DifficultySchedule
+from GAME_CONSTANTS import MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE, STALL_FRAMES
+from Physics import FixedTimestep, TICK
+from SharedPopulation import SharedPopulation
+from Simulation import Simulation
+
+# Shared populations this worker process is attached to, by name
+_attached: dict[str, SharedPopulation] = {}
+
+
+# Runs in the worker process. Only plain arrays travel in both directions, never FlappyBirdAgent objects.
+def evaluate_shard(weights: np.ndarray, x: np.ndarray, y: np.ndarray, velocity: np.ndarray, seed: int,
+                   max_frames: int, max_score: int, stall_frames: int,
+                   timestep: FixedTimestep, schedule: DifficultySchedule,
+                   controller: Controller) -> tuple[np.ndarray, ...]:
+    population = BatchPopulation(weights, x, y, velocity, controller)
+    timed_out = run_generation(population, Simulation(schedule=schedule), max_frames, max_score, seed, stall_frames=stall_frames,
+                               timestep=timestep)
+    return population.score.astype(np.int32), population.distance_traveled, population.gap_closeness, \
+        population.alive, timed_out
+
+
+# Runs in the worker process on rows start:stop of a shared population, read and written in place. Only the
+# handle and the range come in, only timed_out goes back.
+def evaluate_range(handle: tuple[str, int, int], start: int, stop: int, seed: int, max_frames: int, max_score: int,
+                   stall_frames: int, timestep: FixedTimestep, schedule: DifficultySchedule,
+                   controller: Controller) -> bool:
+    store = _attached.get(handle[0])
+    if store is None:
+        # An evaluator uses two blocks at most, older ones were replaced
+        while len(_attached) >= 2:
+            _attached.pop(next(iter(_attached))).close()
+        store = _attached[handle[0]] = SharedPopulation.attach(handle)
+
+    rows = slice(start, stop)
+    population = BatchPopulation(store.weights[rows], store.x[rows], store.y[rows], store.velocity[rows], controller)
+    timed_out = run_generation(population, Simulation(schedule=schedule), max_frames, max_score, seed,
+                               stall_frames=stall_frames, timestep=timestep)
+    store.score[rows] = population.score
+    store.distance_traveled[rows] = population.distance_traveled
+    store.gap_closeness[rows] = population.gap_closeness
+    store.alive[rows] = population.alive
+    return timed_out
+
+
+# Splits a generation across a pool of processes. Every shard replays the same seeded pipe course,
+# so the scores coming back from different workers can be compared and merged as one generation.
+class ParallelEvaluator:
+    def __init__(self, workers=None, max_frames=MAX_GENERATION_FRAMES, max_score=MAX_GENERATION_SCORE,
+                 stall_frames=STALL_FRAMES, timestep: FixedTimestep = TICK,
+                 schedule: DifficultySchedule = CONSTANT):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_frames = max_frames
+        self.max_score = max_score
+        self.stall_frames = stall_frames
+        self.timestep = timestep
+        self.schedule = schedule
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        # The populations travel to the workers through shared memory. store holds the genetic algorithm's
+        # weights once share() was called, scratch any other population the evaluator is handed.
+        self.store: SharedPopulation = None
+        self.scratch: SharedPopulation = None
+        self.ga = None
+
+    # Moves the genetic algorithm's weights into shared memory. Populations spawned with spawn() then live
+    # there too and evaluate copies nothing: workers read the weights where the algorithm bred them and
+    # write their results where end_generation reads them.
+    def share(self, ga) -> SharedPopulation:
+        self.store = SharedPopulation.create(ga.population_size, ga.controller.parameter_count)
+        ga.rebind_weights(self.store.weights)
+        self.ga = ga
+        return self.store
+
+    def spawn(self, weights, rng: np.random.Generator, controller: Controller) -> BatchPopulation:
+        if self.store is not None and len(weights) == len(self.store):
+            return self.store.spawn(weights, rng, controller)
+        return BatchPopulation.spawn(weights, rng, controller)
+
+    def _buffers(self, population: BatchPopulation) -> SharedPopulation:
+        if self.store is not None and np.may_share_memory(population.weights, self.store.weights):
+            return self.store
+        # The birds the fitness cache hands in change in number every generation, the scratch block only grows
+        # so the workers do not have to attach to a new one every time
+        scratch = self.scratch
+        parameter_count = population.controller.parameter_count
+        if scratch is None or len(scratch) < len(population) or scratch.parameter_count != parameter_count:
+            if scratch is not None:
+                scratch.close()
+            size = max(len(population), 2 * len(scratch) if scratch is not None else 0)
+            scratch = self.scratch = SharedPopulation.create(size, parameter_count)
+        return scratch
+
+    # Plays the population in the workers, its score, distance_traveled, gap_closeness and alive arrays
+    # are filled in place. Every worker gets one contiguous range of rows.
+    def evaluate(self, population: BatchPopulation, seed: int) -> bool:
+        store = self._buffers(population)
+        store.load(population)
+        bounds = np.linspace(0, len(population), min(self.workers, len(population)) + 1).astype(int)
+        futures = [self.executor.submit(evaluate_range, store.handle, start, stop, seed,
+                                        self.max_frames, self.max_score, self.stall_frames, self.timestep,
+                                        self.schedule, population.controller)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        timed_out = False
+        for future in futures:
+            timed_out = future.result() or timed_out
+        store.unload(population)
+        population.compact()
+        return timed_out
+
+    def close(self):
+        self.executor.shutdown()
+        if self.ga is not None:
+            # The genetic algorithm outlives the shared block
+            self.ga.rebind_weights(self.ga.pool.weights.copy())
+        for store in (self.store, self.scratch):
+            if store is not None:
+                store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,37 +1,22 @@
-
-import math
 import random
 
+import numpy as np
+
+from Controller import Controller, LINEAR
+
 
 class Perceptron:
-    def __init__(self, weights=None):
+    # weights can be any sequence of controller.parameter_count floats, AgentPool hands out rows of its weight matrix
+    __slots__ = ("weights", "controller")
 
+    def __init__(self, weights=None, controller: Controller = LINEAR):
+        self.controller = controller
         if weights is None:
-            self.weights = [random.uniform(-0.1, 0.1) for _ in range(4)]
+            self.weights = [random.uniform(-0.1, 0.1) for _ in range(controller.parameter_count)]
         else:
             self.weights = weights
 
-    def sigmoid(self, x):
-
-        x = max(-500, min(500, x))
-
-        try:
-            return 1 / (1 + math.exp(-x))
-        except OverflowError:
-            # Fallback for extreme values
-            return 1.0 if x > 0 else 0.0
+    # Flap probability for one set of sensors, the batch code runs the same controller for all birds at once
     def feed_forward(self, inputs):
-
-        normalized_inputs = [
-            inputs[0] / 1000.0,
-            inputs[1] / 2000.0,
-            inputs[2] / 1000.0,
-            inputs[3]
-        ]
-
-        # Linear multiplication: f(I) = W^T * I = w0*i0 + w1*i1 + w2*i2 + w3*b
-        linear_output = sum(w * i for w, i in zip(self.weights, normalized_inputs))
-
-        result = self.sigmoid(linear_output)
-
-        return result
\ No newline at end of file
+        params = np.asarray(self.weights, dtype=np.float64)[None, :]
+        return float(self.controller.output(params, np.asarray(inputs, dtype=np.float64)[None, :])[0])
@@ -1,4 +1,6 @@
 class Pipe:
+    __slots__ = ("left_down", "left_up", "width", "left_y")
+
     def __init__(self, left_down:int, left_up:int, width:int, left_x:int):
         self.left_down = left_down
         self.left_up = left_up
@@ -0,0 +1,97 @@
+import os
+import struct
+
+import numpy as np
+
+from Checkpoint import Checkpoint
+from Controller import Controller, pack_spec, unpack_spec
+
+MAGIC = b"FBPL"
+VERSION = 2
+# magic, version, sensors, parameters, best score, generation
+HEADER = struct.Struct("<4sHHIiI")
+
+# Policy file layout, all little endian:
+#   header | controller spec (uint16 length + ASCII) | sensor scales (float64, one per sensor) | parameters (float64)
+# The scales are the ones the brain was trained with, a policy only loads where they are still the same.
+
+
+# One trained brain on its own: what it expects to see and its parameters, ready to answer sensor readings
+# from any number of games at once. Sensors are the raw readings of BatchPopulation.get_sensors, one row per bird
+# (the basic set, plus velocity and the gap after the next one for "extended" controllers).
+class Policy:
+    def __init__(self, controller: Controller, weights, best_score: int = -1, generation: int = 0):
+        self.controller = controller
+        self.weights = np.asarray(weights, dtype=np.float64).reshape(controller.parameter_count)
+        # The same row for every request of a batch, broadcast instead of copied
+        self._params = self.weights[None, :]
+        self.best_score = best_score
+        self.generation = generation
+
+    @property
+    def sensor_count(self) -> int:
+        return self.controller.sensor_count
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint: Checkpoint) -> "Policy":
+        if checkpoint.best_weights is None:
+            raise ValueError("the checkpoint has no champion yet")
+        return cls(checkpoint.controller, checkpoint.best_weights, checkpoint.best_score, checkpoint.generation)
+
+    def _logits(self, sensors) -> np.ndarray:
+        sensors = np.asarray(sensors, dtype=np.float64).reshape(-1, self.sensor_count)
+        return self.controller.logits(np.broadcast_to(self._params, (len(sensors), len(self.weights))), sensors)
+
+    # Flap probability for every row of sensors (requests, sensor_count), what Perceptron.feed_forward
+    # gives for one bird
+    def flap_probability(self, sensors) -> np.ndarray:
+        return _sigmoid(self._logits(sensors))
+
+    def decide(self, sensors) -> np.ndarray:
+        return self._logits(sensors) > 0
+
+    # Both of the above from one forward pass
+    def act(self, sensors) -> tuple[np.ndarray, np.ndarray]:
+        logits = self._logits(sensors)
+        flap = logits > 0
+        return flap, _sigmoid(logits)
+
+
+# Same tanh form as Controller.output
+def _sigmoid(logits: np.ndarray) -> np.ndarray:
+    logits *= 0.5
+    np.tanh(logits, out=logits)
+    logits *= 0.5
+    logits += 0.5
+    return logits
+
+
+def save_policy(path: str, policy: Policy):
+    controller = policy.controller
+    header = HEADER.pack(MAGIC, VERSION, controller.sensor_count, len(policy.weights), policy.best_score,
+                         policy.generation) + pack_spec(controller)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        file.write(controller.scale.astype(np.float64).tobytes())
+        file.write(policy.weights.tobytes())
+    os.replace(temporary, path)
+
+
+def load_policy(path: str) -> Policy:
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a policy file")
+    magic, version, sensor_count, parameter_count, best_score, generation = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} policy file")
+
+    controller, offset = unpack_spec(data, HEADER.size)
+    scale = np.frombuffer(data, dtype=np.float64, count=sensor_count, offset=offset)
+    if sensor_count != controller.sensor_count or not np.array_equal(scale, controller.scale):
+        raise ValueError(f"{path} was exported with other sensor scales than {controller.sensors!r} uses now")
+    if parameter_count != controller.parameter_count:
+        raise ValueError(f"{path} holds {parameter_count} parameters, {controller!r} needs {controller.parameter_count}")
+    weights = np.frombuffer(data, dtype=np.float64, count=parameter_count, offset=offset + scale.nbytes)
+    return Policy(controller, weights.copy(), best_score, generation)
@@ -0,0 +1,147 @@
+import asyncio
+import struct
+
+import numpy as np
+
+from Policy import Policy
+
+HOST = "127.0.0.1"
+PORT = 8765
+# A batch is run as soon as it holds MAX_BATCH requests or MAX_DELAY seconds after its first request came in
+MAX_BATCH = 256
+MAX_DELAY = 0.0005
+
+# Protocol, all little endian. On connect the server sends HELLO: "FBPS" and the number of sensors it expects.
+# The client then sends requests: an id of its choosing and the raw sensor readings as float64.
+# Every request gets one RESPONSE with the same id: flap (0 or 1) and the flap probability. A client may have any
+# number of requests in flight on one connection, responses come in the order their batches were run.
+HELLO = struct.Struct("<4sH")
+REQUEST_ID = struct.Struct("<I")
+RESPONSE = struct.Struct("<IBd")
+SERVER_MAGIC = b"FBPS"
+
+
+# Collects the requests of all connections and answers them with one forward pass per batch
+class MicroBatcher:
+    def __init__(self, policy: Policy, max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY):
+        self.policy = policy
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.sensor_bytes = policy.sensor_count * 8
+        # Raw sensor bytes, and the request id and writer every answer goes to
+        self.sensors: list[bytes] = []
+        self.replies: list[tuple[int, asyncio.StreamWriter]] = []
+        self.timer = None
+        self.requests = 0
+        self.batches = 0
+
+    def submit(self, request_id: int, sensors: bytes, writer: asyncio.StreamWriter):
+        self.sensors.append(sensors)
+        self.replies.append((request_id, writer))
+        if len(self.sensors) >= self.max_batch:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if not self.sensors:
+            return
+        sensors = np.frombuffer(b"".join(self.sensors), dtype=np.float64).reshape(-1, self.policy.sensor_count)
+        replies = self.replies
+        self.sensors = []
+        self.replies = []
+
+        flaps, probabilities = self.policy.act(sensors)
+        self.requests += len(replies)
+        self.batches += 1
+        # Answers for the same connection are written together
+        out: dict[asyncio.StreamWriter, list[bytes]] = {}
+        for (request_id, writer), flap, probability in zip(replies, flaps.tolist(), probabilities.tolist()):
+            out.setdefault(writer, []).append(RESPONSE.pack(request_id, flap, probability))
+        for writer, responses in out.items():
+            if not writer.is_closing():
+                writer.write(b"".join(responses))
+
+    @property
+    def mean_batch(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+
+# Serves one policy on a local TCP port to any number of game clients
+class PolicyServer:
+    def __init__(self, policy: Policy, host: str = HOST, port: int = PORT, max_batch: int = MAX_BATCH,
+                 max_delay: float = MAX_DELAY):
+        self.policy = policy
+        self.host = host
+        self.port = port
+        self.batcher = MicroBatcher(policy, max_batch, max_delay)
+        self.server = None
+
+    # Starts listening, port 0 picks a free port. Returns the port.
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        self.batcher.flush()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(HELLO.pack(SERVER_MAGIC, self.policy.sensor_count))
+        frame = REQUEST_ID.size + self.batcher.sensor_bytes
+        try:
+            while True:
+                data = await reader.readexactly(frame)
+                self.batcher.submit(REQUEST_ID.unpack_from(data)[0], data[REQUEST_ID.size:], writer)
+                # Only waits while the client is not reading its answers
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+# One game's connection to a PolicyServer, one request at a time
+class PolicyClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, sensor_count: int):
+        self.reader = reader
+        self.writer = writer
+        self.sensor_count = sensor_count
+        self.next_id = 0
+
+    @classmethod
+    async def connect(cls, host: str = HOST, port: int = PORT) -> "PolicyClient":
+        reader, writer = await asyncio.open_connection(host, port)
+        magic, sensor_count = HELLO.unpack(await reader.readexactly(HELLO.size))
+        if magic != SERVER_MAGIC:
+            writer.close()
+            raise ConnectionError(f"{host}:{port} is not a policy server")
+        return cls(reader, writer, sensor_count)
+
+    # Flap decision and probability for one set of sensors, one row of BatchPopulation.get_sensors
+    async def act(self, sensors) -> tuple[bool, float]:
+        sensors = np.asarray(sensors, dtype=np.float64)
+        if sensors.shape != (self.sensor_count,):
+            raise ValueError(f"the policy expects {self.sensor_count} sensors, got {sensors.shape}")
+        request_id = self.next_id
+        self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+        self.writer.write(REQUEST_ID.pack(request_id) + sensors.tobytes())
+        answer_id, flap, probability = RESPONSE.unpack(await self.reader.readexactly(RESPONSE.size))
+        if answer_id != request_id:
+            raise ConnectionError(f"answer {answer_id} for request {request_id}")
+        return bool(flap), probability
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
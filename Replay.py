@@ -0,0 +1,229 @@
+import os
+import random
+import struct
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+from Controller import LINEAR
+from Difficulty import DifficultySchedule
+from FlappyBirdAgent import FlappyBirdAgent
+from Physics import FixedTimestep
+from Simulation import Simulation
+
+MAGIC = b"FBRP"
+VERSION = 2
+FILE_HEADER = struct.Struct("<4sH")
+# record size, generation, reason, course seed, dt, substeps, swept, spawn x, y, velocity, final score,
+# pipe gap, pipe width, speeds, distances, weights, frames
+RECORD = struct.Struct("<IIBQdHBdddIHHHHHI")
+
+# Why a bird was recorded
+CHAMPION = 0
+FIRST_DEATH = 1
+MANUAL = 2
+REASONS = {CHAMPION: "champion", FIRST_DEATH: "first death", MANUAL: "manual"}
+
+# Replay log layout, all little endian:
+#   "FBRP" | version (uint16) | record | record | ...
+# record: RECORD | speeds (float64) | distances (float64) | weights (float64) | flap bits, one per step (packed)
+# The flaps and the seeded course are enough to play the run again, the weights are kept to look at.
+
+
+# One bird's run: everything needed to simulate it again step by step without its brain
+class ReplayRecord:
+    def __init__(self, generation: int, reason: int, seed: int, schedule: DifficultySchedule,
+                 timestep: FixedTimestep, spawn: tuple[float, float, float], flaps: np.ndarray, score: int,
+                 weights=()):
+        self.generation = generation
+        self.reason = reason
+        self.seed = seed
+        self.schedule = schedule
+        self.timestep = timestep
+        self.spawn = spawn
+        self.flaps = np.asarray(flaps, dtype=bool)
+        self.score = score
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.flaps)
+
+    def __repr__(self):
+        return f"ReplayRecord(generation={self.generation}, {REASONS.get(self.reason, self.reason)}, " \
+               f"seed={self.seed}, steps={len(self)}, score={self.score})"
+
+    def to_bytes(self) -> bytes:
+        schedule = self.schedule
+        body = np.concatenate((np.asarray(schedule.speeds, dtype=np.float64),
+                               np.asarray(schedule.distances, dtype=np.float64), self.weights)).tobytes() + \
+            np.packbits(self.flaps).tobytes()
+        header = RECORD.pack(RECORD.size + len(body), self.generation, self.reason, self.seed, self.timestep.dt,
+                             self.timestep.substeps, self.timestep.swept, *self.spawn, self.score, schedule.pipe_gap,
+                             schedule.pipe_width, len(schedule.speeds), len(schedule.distances), len(self.weights),
+                             len(self.flaps))
+        return header + body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ReplayRecord":
+        size, generation, reason, seed, dt, substeps, swept, x, y, velocity, score, pipe_gap, pipe_width, \
+            speed_count, distance_count, weight_count, frames = RECORD.unpack_from(data)
+        values = np.frombuffer(data, dtype=np.float64, count=speed_count + distance_count + weight_count,
+                               offset=RECORD.size)
+        flaps = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=RECORD.size + values.nbytes), count=frames)
+        speeds = values[:speed_count].tolist()
+        distances = values[speed_count:speed_count + distance_count].tolist()
+        # Whole numbers come back as ints so the schedule compares equal to the one recorded
+        schedule = DifficultySchedule([int(v) if v.is_integer() else v for v in speeds],
+                                      [int(v) if v.is_integer() else v for v in distances], pipe_gap, pipe_width)
+        return cls(generation, reason, seed, schedule, FixedTimestep(dt, substeps, bool(swept)), (x, y, velocity),
+                   flaps.astype(bool), score, values[speed_count + distance_count:].copy())
+
+
+def write_replays(path: str, records: list[ReplayRecord]):
+    new = not os.path.exists(path) or os.path.getsize(path) == 0
+    if not new:
+        with open(path, "rb") as file:
+            magic, version = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay log, records cannot be added to it")
+    with open(path, "ab") as file:
+        if new:
+            file.write(FILE_HEADER.pack(MAGIC, VERSION))
+        for record in records:
+            file.write(record.to_bytes())
+
+
+def read_replays(path: str) -> list[ReplayRecord]:
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < FILE_HEADER.size:
+        raise ValueError(f"{path} is not a replay log")
+    magic, version = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a replay log")
+    if version != VERSION:
+        raise ValueError(f"unsupported replay version {version}")
+
+    records = []
+    offset = FILE_HEADER.size
+    while offset + RECORD.size <= len(data):
+        size = RECORD.unpack_from(data, offset)[0]
+        if offset + size > len(data):
+            # A record cut off by a crash while it was written
+            break
+        records.append(ReplayRecord.from_bytes(data[offset:offset + size]))
+        offset += size
+    return records
+
+
+# Collects the flaps of a whole generation while it is played, and keeps the champion and the first bird
+# to die. The flaps of every step are only the rows that flapped, picking the kept birds out happens once
+# at the end of the generation.
+class ReplayRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.games = 0
+        self.flapped = []
+        self.steps_alive = None
+        self.first_death = -1
+
+    def begin(self, population: BatchPopulation, simulation: Simulation, timestep: FixedTimestep):
+        self.seed = simulation.seed
+        self.schedule = simulation.schedule
+        self.timestep = timestep
+        self.spawn_x = population.spawn_x.copy()
+        self.spawn_y = population.y.copy()
+        self.spawn_velocity = population.spawn_velocity.copy()
+        self.weights = population.weights
+        self.flapped = []
+        self.steps_alive = np.zeros(len(population), dtype=np.int64)
+        self.first_death = -1
+
+    # Called after every step of the generation
+    def observe(self, population: BatchPopulation):
+        rows, flap = population.last_decision
+        self._observe(rows, rows[flap], population.live_rows)
+
+    def _observe(self, rows: np.ndarray, flapped: np.ndarray, survivors: np.ndarray):
+        self.steps_alive[rows] += 1
+        self.flapped.append(flapped)
+        if self.first_death < 0 and len(survivors) < len(rows):
+            self.first_death = int(np.setdiff1d(rows, survivors)[0])
+
+    def record(self, row: int, generation: int, reason: int, score: int) -> ReplayRecord:
+        steps = int(self.steps_alive[row])
+        flaps = np.zeros(steps, dtype=bool)
+        for step, rows in enumerate(self.flapped[:steps]):
+            # Rows are kept in ascending order, so membership is a binary search
+            index = np.searchsorted(rows, row)
+            flaps[step] = index < len(rows) and rows[index] == row
+        return ReplayRecord(generation, reason, self.seed, self.schedule, self.timestep,
+                            (float(self.spawn_x[row]), float(self.spawn_y[row]), float(self.spawn_velocity[row])),
+                            flaps, score, self.weights[row])
+
+    # Writes the champion by fitness and the first bird that died, returns what was written
+    def end_generation(self, generation: int, scores: np.ndarray, fitness: np.ndarray) -> list[ReplayRecord]:
+        champion = int(np.argmax(fitness))
+        records = [self.record(champion, generation, CHAMPION, int(scores[champion]))]
+        if self.first_death >= 0 and self.first_death != champion:
+            records.append(self.record(self.first_death, generation, FIRST_DEATH, int(scores[self.first_death])))
+        write_replays(self.path, records)
+        self.flapped = []
+        return records
+
+    # Same thing for FlappyBirdGame, where the birds are FlappyBirdAgent objects and the flaps come from the keys
+    def begin_agents(self, birds: list[FlappyBirdAgent], simulation: Simulation, timestep: FixedTimestep):
+        self.begin(BatchPopulation.from_agents(birds), simulation, timestep)
+        self.games += 1
+
+    # rows are the birds that were alive before the step, flapped those of them that flapped
+    def observe_agents(self, rows: list[int], flapped: list[int], birds: list[FlappyBirdAgent]):
+        self._observe(np.array(rows, dtype=np.int64), np.array(flapped, dtype=np.int64),
+                      np.array([i for i in rows if birds[i].is_alive], dtype=np.int64))
+
+    def end_game(self, birds: list[FlappyBirdAgent]) -> list[ReplayRecord]:
+        records = [self.record(i, self.games, MANUAL, bird.score) for i, bird in enumerate(birds)]
+        write_replays(self.path, records)
+        self.flapped = []
+        return records
+
+
+# The recorded bird, simulated headless with its flaps up to step `until` (the whole run by default).
+# Returns the simulation and the one bird population, ready to be rendered or stepped on from there.
+def fast_forward(record: ReplayRecord, until: int = None) -> tuple[Simulation, BatchPopulation, int]:
+    simulation = Simulation(record.seed, record.schedule)
+    simulation.reset()
+    simulation.update_pipes()
+    x, y, velocity = record.spawn
+    until = len(record) if until is None else min(until, len(record))
+
+    timestep = record.timestep
+    if timestep.dt == 1 and not timestep.swept:
+        # Tick by tick runs go through the scalar game, which plays the same as the batch step
+        # and is several times faster for a single bird. Building the agent draws a spawn and a brain from random,
+        # which a replay must not leave a trace in.
+        state = random.getstate()
+        bird = FlappyBirdAgent()
+        random.setstate(state)
+        bird.x, bird.y, bird.velocity = x, y, velocity
+        flaps = record.flaps
+        step = 0
+        while step < until and bird.is_alive:
+            if flaps[step]:
+                bird.flap()
+            simulation.step([bird])
+            step += 1
+        return simulation, BatchPopulation.from_agents([bird]), step
+
+    # The flaps decide, the brain is never run
+    population = BatchPopulation(np.zeros((1, LINEAR.parameter_count)), [x], [y], [velocity])
+    step = 0
+    while step < until and population.alive_count() > 0:
+        replay_step(record, simulation, population, step)
+        step += 1
+    population.sync()
+    return simulation, population, step
+
+
+def replay_step(record: ReplayRecord, simulation: Simulation, population: BatchPopulation, step: int):
+    population.step(simulation, timestep=record.timestep, flaps=record.flaps[step:step + 1])
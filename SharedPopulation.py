@@ -0,0 +1,120 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+from Controller import Controller, LINEAR
+from GAME_CONSTANTS import SCREEN_HEIGHT, SCREEN_WIDTH, VELOCITY_AFTER_FLAP
+
+ALIGNMENT = 64
+# name, dtype and values per bird of every array, in the order they sit in the block. weights has one value
+# per controller parameter, marked with None.
+FIELDS = (
+    ("weights", np.float64, None),
+    ("x", np.float64, 1),
+    ("y", np.float64, 1),
+    ("velocity", np.float64, 1),
+    ("score", np.int64, 1),
+    ("distance_traveled", np.float64, 1),
+    ("gap_closeness", np.float64, 1),
+    ("alive", np.bool_, 1),
+    ("fitness", np.float64, 1),
+)
+
+
+def _layout(size: int, parameter_count: int) -> tuple[list[tuple[str, int, tuple, np.dtype]], int]:
+    fields = []
+    offset = 0
+    for name, dtype, width in FIELDS:
+        dtype = np.dtype(dtype)
+        shape = (size, parameter_count) if width is None else (size,)
+        fields.append((name, offset, shape, dtype))
+        offset += (int(np.prod(shape)) * dtype.itemsize + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    return fields, max(offset, 1)
+
+
+def _same_memory(a: np.ndarray, b: np.ndarray) -> bool:
+    return isinstance(a, np.ndarray) and a.shape == b.shape and a.ctypes.data == b.ctypes.data
+
+
+# A whole population's arrays in one block of shared memory with a fixed layout, so worker processes
+# attach to it by name and read and write their range of birds in place. Only the handle, a name and two
+# sizes, ever crosses a process boundary.
+# The creating process owns the block and unlinks it on close, attached processes only unmap it.
+class SharedPopulation:
+    def __init__(self, memory: shared_memory.SharedMemory, size: int, parameter_count: int, owner: bool):
+        self.memory = memory
+        self.size = size
+        self.parameter_count = parameter_count
+        self.owner = owner
+        fields, _ = _layout(size, parameter_count)
+        for name, offset, shape, dtype in fields:
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset))
+
+    @classmethod
+    def create(cls, size: int, parameter_count: int = LINEAR.parameter_count) -> "SharedPopulation":
+        _, nbytes = _layout(size, parameter_count)
+        return cls(shared_memory.SharedMemory(create=True, size=nbytes), size, parameter_count, True)
+
+    @classmethod
+    def attach(cls, handle: tuple[str, int, int]) -> "SharedPopulation":
+        name, size, parameter_count = handle
+        return cls(shared_memory.SharedMemory(name=name), size, parameter_count, False)
+
+    @property
+    def handle(self) -> tuple[str, int, int]:
+        return self.memory.name, self.size, self.parameter_count
+
+    def __len__(self):
+        return self.size
+
+    # Copies a population's inputs into the first len(population) rows. Arrays that already are these buffers
+    # are left alone.
+    def load(self, population: BatchPopulation):
+        count = len(population)
+        for name in ("weights", "x", "y", "velocity"):
+            target = getattr(self, name)[:count]
+            source = getattr(population, name)
+            if not _same_memory(source, target):
+                target[:] = source
+
+    # Copies the results the workers wrote back into a population that does not live here
+    def unload(self, population: BatchPopulation):
+        count = len(population)
+        for name in ("score", "distance_traveled", "gap_closeness", "alive"):
+            target = getattr(population, name)
+            source = getattr(self, name)[:count]
+            if not _same_memory(source, target):
+                target[:] = source
+
+    # Population whose full arrays are these buffers, nothing is copied
+    def population(self, controller: Controller = LINEAR) -> BatchPopulation:
+        return BatchPopulation(self.weights, self.x, self.y, self.velocity, controller,
+                               (self.score, self.distance_traveled, self.gap_closeness, self.alive))
+
+    # Same draws as BatchPopulation.spawn, written straight into the buffers
+    def spawn(self, weights, rng: np.random.Generator, controller: Controller = LINEAR) -> BatchPopulation:
+        if not _same_memory(weights, self.weights):
+            self.weights[:] = weights
+        self.x[:] = rng.integers(SCREEN_HEIGHT // 4, SCREEN_HEIGHT // 2, self.size, endpoint=True)
+        self.y[:] = rng.integers(SCREEN_WIDTH // 20, SCREEN_WIDTH // 5, self.size, endpoint=True)
+        self.velocity[:] = VELOCITY_AFTER_FLAP
+        return self.population(controller)
+
+    def close(self):
+        # The views have to go before the memory can be unmapped. Views still held elsewhere keep the mapping
+        # alive until they are collected, the block itself is removed either way.
+        for name, _, _ in FIELDS:
+            setattr(self, name, None)
+        try:
+            self.memory.close()
+        except BufferError:
+            pass
+        if self.owner:
+            self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,154 @@
+from typing import Union
+
+from Course import Course, COURSE_LENGTH, FIRST_PIPE_X, get_course, random_seed
+from Difficulty import CONSTANT, DifficultySchedule
+from FlappyBirdAgent import FlappyBirdAgent
+from GAME_CONSTANTS import SCREEN_WIDTH, SCREEN_HEIGHT, BIRD_DIMENSION, GRAVITY
+from Instrumentation import NULL_PROFILER
+from Pipe import Pipe
+
+
+# Game rules without any pygame dependency: pipes, physics, collision and scoring.
+# FlappyBirdGame draws on top of this, training runs can use it directly on machines without a display.
+# Pipe speed and spacing come from the simulation's own difficulty schedule, never from module globals,
+# so games with different schedules can run side by side in one process.
+class Simulation:
+    def __init__(self, seed=None, schedule: DifficultySchedule = CONSTANT):
+        # With a seed every reset replays the same course, without one each reset draws a new course
+        self.fixed_seed = seed
+        self.schedule = schedule
+        self.course: Course = get_course(seed if seed is not None else random_seed(), COURSE_LENGTH, schedule)
+        self.first_pipe = 0
+        self.end_pipe = 0
+        self.scroll = 0
+        self.score = 0
+        self.distance = 0
+        self.d_first_pipe = 0
+        self._pipes: Union[list[Pipe], None] = None
+
+    @property
+    def seed(self) -> int:
+        return self.course.seed
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.fixed_seed = seed
+        if self.fixed_seed is not None:
+            self.course = get_course(self.fixed_seed, COURSE_LENGTH, self.schedule)
+        else:
+            self.course = get_course(random_seed(), COURSE_LENGTH, self.schedule)
+        self.first_pipe = 0
+        self.end_pipe = 0
+        self.scroll = 0
+        self.score = 0
+        self.distance = 0
+        self.d_first_pipe = 0
+        self._pipes = None
+
+    # Pipes on screen, built from the course only when somebody looks at them
+    @property
+    def pipes(self) -> list[Pipe]:
+        if self._pipes is None:
+            self._pipes = [self.course.pipe(i, self.scroll) for i in range(self.first_pipe, self.end_pipe)]
+        return self._pipes
+
+    def update_pipes(self):
+        course = self.course
+        if self.end_pipe == 0:
+            self.end_pipe = 1
+            self.d_first_pipe = course.pipe_x(0) - self.scroll + course.pipe_width
+        while course.pipe_x(self.first_pipe) - self.scroll + course.pipe_width < 0:
+            self.first_pipe += 1
+        while course.pipe_x(self.end_pipe) - self.scroll <= SCREEN_WIDTH:
+            self.end_pipe += 1
+        self._pipes = None
+
+    def update_physics(self, bird: FlappyBirdAgent):
+        bird.velocity += GRAVITY
+        bird.x += bird.velocity
+
+        if bird.x + BIRD_DIMENSION > SCREEN_HEIGHT or bird.x < 0:
+            bird.is_alive = False
+
+    # Index of the visible pipe nearest to screen position poz_y from the left
+    def pipe_index_at(self, poz_y) -> int:
+        index = int(self.course.index_at(poz_y + self.scroll))
+        return min(max(index, self.first_pipe - 1), self.end_pipe - 1)
+
+    # Only the pipes under the bird's left and right edge can touch it
+    def check_collision(self, bird: FlappyBirdAgent) -> bool:
+        pipes = self.pipes
+        if len(pipes) == 0:
+            return False
+        for edge in (bird.y, bird.y + BIRD_DIMENSION):
+            index = max(self.pipe_index_at(edge), self.first_pipe)
+            if pipes[index - self.first_pipe].collides_with(bird.x, bird.y, BIRD_DIMENSION):
+                return True
+        return False
+
+    # Moves the world dt ticks forward, birds are handled by the caller
+    def advance(self, dt: float = 1):
+        speed = self.schedule.speed_at(self.score)
+        self.distance += speed * dt
+        # Pipes scored so far, counted with the course's spacing
+        passed = self.course.index_at(self.distance - self.d_first_pipe + SCREEN_WIDTH * 0.33 + FIRST_PIPE_X)
+        self.score = max(int(passed), 0)
+
+        self.update_pipes()
+        self.scroll += speed * dt
+        self._pipes = None
+
+    def step(self, birds: list[FlappyBirdAgent], profiler=NULL_PROFILER):
+        pipes = self.end_pipe
+        scroll = self.scroll
+        with profiler.phase("update_pipes"):
+            self.advance()
+        for bird in birds:
+            if bird.is_alive:
+                bird.score = self.score
+                bird.distance_traveled += self.scroll - scroll
+
+        collisions = 0
+        for bird in birds:
+            # Dead birds stay where they fell
+            if not bird.is_alive:
+                continue
+
+            with profiler.phase("physics"):
+                self.update_physics(bird)
+
+            with profiler.phase("collision"):
+                if bird.is_alive and self.check_collision(bird):
+                    collisions += 1
+                    bird.is_alive = False
+
+        if profiler.enabled:
+            profiler.count("steps")
+            profiler.count("collisions", collisions)
+            profiler.count("pipes_spawned", self.end_pipe - pipes)
+
+    def get_closest_pipes(self, poz_y: int) -> Union[tuple[Pipe, Pipe], tuple[None, Pipe], tuple[None, None]]:
+        pipes = self.pipes
+        l = len(pipes)
+
+        # No pipes yet
+        if l == 0:
+            return None, None
+
+        # Only one pipe
+        if l == 1:
+            return None, pipes[0]
+
+        index = self.pipe_index_at(poz_y)
+
+        # Bird is before the first pipe
+        if index < self.first_pipe:
+            return None, pipes[0]
+
+        pipe_current = pipes[index - self.first_pipe]
+        pipe_next = pipes[min(index + 1, self.end_pipe - 1) - self.first_pipe]
+
+        # Bird has passed pipe_current, the last pipe on screen is its own next pipe
+        if poz_y >= pipe_current.left_y + pipe_current.width:
+            return None, pipe_next
+        return pipe_current, pipe_next
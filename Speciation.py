@@ -0,0 +1,126 @@
+import itertools
+from functools import lru_cache
+
+import numpy as np
+
+# Grid cells are threshold / GRID_DIVISIONS wide. Finer cells skip more birds per species,
+# but the number of neighbour cells grows quickly with the number of weights.
+GRID_DIVISIONS = 4
+GRID_MAX_WEIGHTS = 4
+GRID_MIN_BIRDS = 32768
+# A species taking less than this share of the birds left means many species are coming,
+# which is where the grid pays off
+SPARSE_SPECIES_SHARE = 1 / 32
+
+
+def l1_distance(weights: np.ndarray, reference: np.ndarray) -> np.ndarray:
+    # Summed weight by weight in the same order as the Python generator it replaces,
+    # so distances close to the threshold land on the same side
+    distance = np.abs(weights[:, 0] - reference[0])
+    for k in range(1, weights.shape[1]):
+        distance += np.abs(weights[:, k] - reference[k])
+    return distance
+
+
+# Same assignment as the sequential loop in GeneticAlgorithm.speciate used to do: every bird joins the first
+# species (in creation order) whose representative is closer than threshold, otherwise it starts a new species.
+# The first bird that is still unassigned is always the next representative, so each new species can
+# take all its members in one vectorized pass over the birds that are left.
+# Returns the species index of every bird and the bird index of every representative.
+def assign_species(weights: np.ndarray, threshold: float) -> tuple[np.ndarray, list[int]]:
+    weights = np.asarray(weights, dtype=np.float64)
+    use_grid = weights.shape[1] <= GRID_MAX_WEIGHTS
+    species_of, representatives, remaining = _assign_dense(weights, threshold, stop_when_sparse=use_grid)
+
+    # The rest goes through the grid. Nobody left over matched an existing representative,
+    # so the leftovers form an independent problem with the same semantics.
+    if len(remaining) > 0:
+        rest_species, rest_representatives = _assign_with_grid(weights[remaining], threshold)
+        species_of[remaining] = rest_species + len(representatives)
+        representatives += remaining[rest_representatives].tolist()
+    return species_of, representatives
+
+
+def _assign_dense(weights: np.ndarray, threshold: float,
+                  stop_when_sparse: bool = False) -> tuple[np.ndarray, list[int], np.ndarray]:
+    species_of = np.full(len(weights), -1, dtype=np.int64)
+    representatives: list[int] = []
+
+    remaining = np.arange(len(weights))
+    remaining_weights = weights
+    while len(remaining) > 0:
+        representative = int(remaining[0])
+        joins = l1_distance(remaining_weights, weights[representative]) < threshold
+        joins[0] = True
+        species_of[remaining[joins]] = len(representatives)
+        representatives.append(representative)
+
+        sparse = np.count_nonzero(joins) < len(remaining) * SPARSE_SPECIES_SHARE
+        remaining = remaining[~joins]
+        remaining_weights = remaining_weights[~joins]
+        if stop_when_sparse and sparse and len(remaining) >= GRID_MIN_BIRDS:
+            break
+    return species_of, representatives, remaining
+
+
+@lru_cache(maxsize=8)
+def _neighbour_offsets(dimensions: int, threshold: float) -> np.ndarray:
+    # Cell offsets whose closest corner is still within threshold of the representative's cell
+    cell_size = threshold / GRID_DIVISIONS
+    reach = GRID_DIVISIONS + 1
+    offsets = np.array(list(itertools.product(range(-reach, reach + 1), repeat=dimensions)))
+    gap = np.maximum(np.abs(offsets) - 1, 0).sum(axis=1) * cell_size
+    return offsets[gap < threshold]
+
+
+# Spatial index over the weight space: birds are bucketed in grid cells and a new representative
+# only looks at the cells that can hold a bird closer than threshold.
+def _assign_with_grid(weights: np.ndarray, threshold: float) -> tuple[np.ndarray, list[int]]:
+    count, dimensions = weights.shape
+    reach = GRID_DIVISIONS + 1
+
+    cells = np.floor(weights / (threshold / GRID_DIVISIONS)).astype(np.int64)
+    cells -= cells.min(axis=0) - reach
+    radix = cells.max(axis=0) + reach + 1
+    strides = np.cumprod(np.concatenate(([1], radix[:-1])))
+    keys = cells @ strides
+    neighbour_keys = _neighbour_offsets(dimensions, threshold) @ strides
+
+    species_of = np.full(count, -1, dtype=np.int64)
+    assigned = np.zeros(count, dtype=bool)
+    representatives: list[int] = []
+    indexed = 0
+    left = count
+
+    representative = 0
+    while representative < count:
+        # Birds sorted by cell, every occupied cell is a contiguous run of that order.
+        # Rebuilt over the unassigned birds whenever half of the indexed ones got a species.
+        if left * 2 <= indexed or indexed == 0:
+            unassigned = np.flatnonzero(~assigned)
+            order = unassigned[np.argsort(keys[unassigned], kind="stable")]
+            cell_keys, cell_start, cell_count = np.unique(keys[order], return_index=True, return_counts=True)
+            indexed = left
+
+        # Members of all occupied neighbour cells gathered in one go
+        neighbours = keys[representative] + neighbour_keys
+        found = np.minimum(np.searchsorted(cell_keys, neighbours), len(cell_keys) - 1)
+        occupied = found[cell_keys[found] == neighbours]
+        starts = cell_start[occupied]
+        lengths = cell_count[occupied]
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        candidates = order[positions]
+        candidates = candidates[~assigned[candidates]]
+
+        # The representative is one of its own candidates at distance 0
+        joins = candidates[l1_distance(weights[candidates], weights[representative]) < threshold]
+        species_of[joins] = len(representatives)
+        assigned[joins] = True
+        representatives.append(representative)
+        left -= len(joins)
+
+        # argmin finds the first False, i.e. the first bird still without a species
+        representative += int(np.argmin(assigned[representative:]))
+        if assigned[representative]:
+            break
+    return species_of, representatives
@@ -0,0 +1,74 @@
+import time
+
+DISPLAY_FPS = 60
+# Simulation speeds the watch mode cycles through, in steps per second. 0 runs as fast as the CPU allows.
+SIM_RATES = (0, 3600, 600, 60, 10)
+HEADLESS_POLL_INTERVAL = 0.1
+RATE_WINDOW = 0.5
+
+
+# Decides when the training loop should stop stepping to draw a frame. The simulation itself is never
+# tied to the display: it runs at full speed (or at sim_rate) and frames are sampled display_fps times a second.
+# Headless keeps only a slow event poll, so training can be sped up or watched again at runtime.
+class WatchMode:
+    def __init__(self, display_fps: int = DISPLAY_FPS, sim_rate: int = 0, headless: bool = False):
+        self.display_fps = display_fps
+        self.sim_rate = sim_rate
+        self.headless = headless
+        self.steps_per_second = 0.0
+
+        now = time.perf_counter()
+        self.next_frame = now
+        self.rate_start = now
+        self.rate_steps = 0
+        self.throttle_start = now
+        self.throttle_steps = 0
+
+    def step_done(self) -> bool:
+        now = time.perf_counter()
+
+        self.rate_steps += 1
+        if now - self.rate_start >= RATE_WINDOW:
+            self.steps_per_second = self.rate_steps / (now - self.rate_start)
+            self.rate_start = now
+            self.rate_steps = 0
+
+        if self.sim_rate > 0:
+            self.throttle_steps += 1
+            wait = self.throttle_start + self.throttle_steps / self.sim_rate - now
+            if wait > 0:
+                time.sleep(wait)
+                now += wait
+
+        if now < self.next_frame:
+            return False
+        self.next_frame = now + (HEADLESS_POLL_INTERVAL if self.headless else 1 / self.display_fps)
+        return True
+
+    def toggle_headless(self):
+        self.headless = not self.headless
+        self.next_frame = time.perf_counter()
+
+    def faster(self):
+        self.set_sim_rate(SIM_RATES[max(self._rate_index() - 1, 0)])
+
+    def slower(self):
+        self.set_sim_rate(SIM_RATES[min(self._rate_index() + 1, len(SIM_RATES) - 1)])
+
+    def set_sim_rate(self, sim_rate: int):
+        self.sim_rate = sim_rate
+        self.throttle_start = time.perf_counter()
+        self.throttle_steps = 0
+
+    def _rate_index(self) -> int:
+        if self.sim_rate <= 0:
+            return 0
+        # Nearest preset at or below the current rate
+        for i, rate in enumerate(SIM_RATES[1:], start=1):
+            if rate <= self.sim_rate:
+                return i
+        return len(SIM_RATES) - 1
+
+    def describe(self) -> str:
+        rate = "max" if self.sim_rate <= 0 else f"{self.sim_rate}/s"
+        return f"{self.steps_per_second:.0f} steps/s (target {rate})"
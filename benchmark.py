@@ -0,0 +1,146 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+from GeneticAlgorithm import GeneticAlgorithm
+from Fitness import fitness
+from Instrumentation import Profiler
+from Simulation import Simulation
+
+PHASES = ("sensors", "feed_forward", "physics", "collision", "update_pipes", "speciation", "reproduction")
+# Phases faster than this in the baseline are too noisy to call a regression on
+MIN_COMPARED_SECONDS = 0.005
+
+
+# The fixed scenario: a seeded population plays `generations` generations of the same seeded course,
+# each cut after `frames` steps. Returns the measurements of one run.
+def run_scenario(size: int, generations: int, frames: int, seed: int) -> dict:
+    profiler = Profiler()
+    ga = GeneticAlgorithm(population_size=size, seed=seed)
+    simulation = Simulation(seed)
+    population = BatchPopulation.spawn(ga.pool.weights, ga.rng, ga.controller)
+
+    steps = 0
+    bird_steps = 0
+    start = time.perf_counter()
+    for _ in range(generations):
+        simulation.reset()
+        simulation.update_pipes()
+        for _ in range(frames):
+            alive = population.alive_count()
+            if alive == 0:
+                break
+            population.step(simulation, profiler)
+            steps += 1
+            bird_steps += alive
+
+        weights = ga.next_generation(fitness(population), profiler)
+        population = BatchPopulation.spawn(weights, ga.rng, ga.controller)
+    seconds = time.perf_counter() - start
+
+    return {
+        "population": size,
+        "steps": steps,
+        "bird_steps": bird_steps,
+        "seconds": seconds,
+        "bird_steps_per_second": bird_steps / seconds if seconds > 0 else 0.0,
+        "phases": {phase: profiler.phase(phase).histogram.total for phase in PHASES},
+    }
+
+
+# Peak traced memory of one generation, measured in a separate run because tracing slows everything down
+def peak_memory(size: int, frames: int, seed: int) -> int:
+    tracemalloc.start()
+    try:
+        run_scenario(size, 1, frames, seed)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def benchmark(sizes: list[int], generations: int, frames: int, seed: int, repeat: int) -> dict:
+    results = []
+    for size in sizes:
+        # Fastest of the repeats, the scenario is deterministic so they only differ by noise
+        result = min((run_scenario(size, generations, frames, seed) for _ in range(repeat)),
+                     key=lambda run: run["seconds"])
+        result["peak_memory_bytes"] = peak_memory(size, frames, seed)
+        results.append(result)
+        print_result(result)
+    return {
+        "scenario": {"generations": generations, "frames": frames, "seed": seed, "repeat": repeat},
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "machine": platform.machine(), "processor": platform.processor()},
+        "results": results,
+    }
+
+
+def print_result(result: dict):
+    phases = " ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in result["phases"].items())
+    print(f"{result['population']:>8} birds {result['bird_steps_per_second']:>14,.0f} bird-steps/s "
+          f"peak {result.get('peak_memory_bytes', 0) / 2 ** 20:.1f} MiB  {phases}")
+
+
+# Regressions of `current` against `baseline`, as readable lines. Throughput may not drop and phase time
+# per step and peak memory may not grow by more than tolerance.
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    regressions = []
+    baseline_results = {result["population"]: result for result in baseline["results"]}
+    for result in current["results"]:
+        size = result["population"]
+        reference = baseline_results.get(size)
+        if reference is None:
+            continue
+
+        throughput = result["bird_steps_per_second"] / reference["bird_steps_per_second"]
+        if throughput < 1 - tolerance:
+            regressions.append(f"{size} birds: bird-steps/s down {1 - throughput:.0%} "
+                               f"({reference['bird_steps_per_second']:,.0f} -> {result['bird_steps_per_second']:,.0f})")
+
+        for phase in PHASES:
+            before = reference["phases"].get(phase, 0.0)
+            if before < MIN_COMPARED_SECONDS:
+                continue
+            ratio = (result["phases"][phase] / max(result["steps"], 1)) / (before / max(reference["steps"], 1))
+            if ratio > 1 + tolerance:
+                regressions.append(f"{size} birds: {phase} per step up {ratio - 1:.0%}")
+
+        memory = result["peak_memory_bytes"] / max(reference["peak_memory_bytes"], 1)
+        if memory > 1 + tolerance:
+            regressions.append(f"{size} birds: peak memory up {memory - 1:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput, phase timings and memory of the headless simulation")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--generations", type=int, default=3)
+    parser.add_argument("--frames", type=int, default=300, help="steps after which a generation is cut")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, the fastest one is kept")
+    parser.add_argument("--output", default="benchmark.json", help="file the results are written to")
+    parser.add_argument("--compare", default=None, help="baseline results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    report = benchmark(args.sizes, args.generations, args.frames, args.seed, max(1, args.repeat))
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.compare}")
@@ -0,0 +1,15 @@
+import argparse
+
+from Checkpoint import load_checkpoint
+from Policy import Policy, save_policy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Writes the champion of a checkpoint as a policy file")
+    parser.add_argument("checkpoint", help="checkpoint written with --checkpoint")
+    parser.add_argument("policy", help="policy file to write")
+    args = parser.parse_args()
+
+    policy = Policy.from_checkpoint(load_checkpoint(args.checkpoint))
+    save_policy(args.policy, policy)
+    print(f"{policy.controller.spec} champion of generation {policy.generation} (score {policy.best_score}) "
+          f"written to {args.policy}")
@@ -1,80 +1,252 @@
 
-import pygame
+import argparse
+import random
 
-from FlappyBirdGame import FlappyBirdGame, GAME_CLOSE, GAME_RUNNING
+import numpy as np
+from typing import TYPE_CHECKING
+
+from BatchPopulation import BatchPopulation, StallDetector, run_generation
+from Checkpoint import CheckpointWriter, load_checkpoint, resume
+from Controller import Controller, SENSOR_SCALES
+from Curriculum import Curriculum
+from Difficulty import SCHEDULES
+from Fitness import FitnessCache, fitness as bird_fitness
 from GeneticAlgorithm import GeneticAlgorithm
 from FlappyBirdAgent import FlappyBirdAgent
+from GAME_CONSTANTS import DISTANCE_TARGET, MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE, STALL_FRAMES
+from Instrumentation import NULL_PROFILER, Profiler
+from Metrics import GenerationMetrics, MetricsWriter
+from Islands import IslandConfig, MIGRANTS, MIGRATION_INTERVAL, run_islands
+from ParallelEvaluator import ParallelEvaluator
+from Physics import FixedTimestep, TICK
+from Replay import ReplayRecorder
+from Simulation import Simulation
+from WatchMode import WatchMode, DISPLAY_FPS
+
+# pygame and the window code are only imported by the paths that open a window,
+# so headless training and the evaluator workers start without them
+if TYPE_CHECKING:
+    from FlappyBirdGame import FlappyBirdGame
+
+
+def end_generation(ga: GeneticAlgorithm, population: BatchPopulation, generation, profiler=NULL_PROFILER,
+                   fitness=None, pin_clones=False, spawn=BatchPopulation.spawn, metrics: GenerationMetrics = None,
+                   champion_rows=None):
+    #NATURAL SELECTION & NEXT GENERATION
+    if metrics is not None:
+        # Aggregated while the generation was played, the population is not gone over again
+        summary = metrics.finish(population)
+        best_score = int(summary["score"]["max"])
+        best_distance = int(summary["distance"]["max"])
+        avg_distance = summary["distance"]["mean"]
+    else:
+        best_score = int(population.score.max())
+        best_distance = int(population.distance_traveled.max())
+        avg_distance = float(population.distance_traveled.mean())
+
+    print(f"Generation {generation} ended:")
+    print(f"  Best score: {best_score}")
+    print(f"  Best distance: {best_distance} pixels")
+    print(f"  Avg distance: {avg_distance:.1f} pixels")
+
+    # The pool's agents keep pointing at ga.pool.weights, so they follow the new generation without being touched
+    with profiler.phase("turnover"):
+        ga.track_champion(population.score, champion_rows)
+        weights = ga.next_generation(bird_fitness(population) if fitness is None else fitness, profiler)
+        next_population = spawn(weights, ga.rng, ga.controller)
+        if pin_clones:
+            # Champions start where they started last time, on a fixed course they replay the same run
+            clones = np.flatnonzero(ga.clones)
+            next_population.pin(clones, population, ga.parents[clones])
 
+    profiler.end_generation(generation, population=len(population), best_score=best_score,
+                            best_distance=best_distance, avg_distance=avg_distance)
+    if metrics is not None:
+        metrics.write(generation, summary, species=ga.species_count)
+    return next_population, best_distance
 
-def run_autonomous_mode(game: FlappyBirdGame, ga: GeneticAlgorithm, birds, max_generations=100):
-    clock = pygame.time.Clock()
-    FPS = 60
-    DISTANCE_TARGET = 20000
-    display_frame = 5
-    frame = 0
 
+def run_headless_mode(simulation: Simulation, ga: GeneticAlgorithm, birds, max_generations=100,
+                      evaluator: ParallelEvaluator = None, seed=None, checkpoints: CheckpointWriter = None,
+                      profiler=NULL_PROFILER, stall_frames=STALL_FRAMES, timestep: FixedTimestep = TICK,
+                      curriculum: Curriculum = None, fixed_course=False, cache: FitnessCache = None,
+                      recorder: ReplayRecorder = None, metrics: GenerationMetrics = None):
+    if (evaluator is not None or fixed_course) and seed is None:
+        seed = random.randrange(2 ** 31)
+    max_frames, max_score = MAX_GENERATION_FRAMES, MAX_GENERATION_SCORE
+    if evaluator is not None:
+        stall_frames, timestep = evaluator.stall_frames, evaluator.timestep
+        max_frames, max_score = evaluator.max_frames, evaluator.max_score
+    # Cached results are only valid for a course that comes back and for runs no other bird can cut short
+    if cache is not None and (not fixed_course or curriculum is not None or stall_frames > 0):
+        print("Fitness cache off: it needs a fixed course, no curriculum and no stall detection")
+        cache = None
+    # Flaps are only seen when the whole generation is stepped here
+    if recorder is not None and (evaluator is not None or curriculum is not None or cache is not None):
+        print("Replay recording off: it needs one process, no curriculum and no fitness cache")
+        recorder = None
+    context = (simulation.schedule, timestep.dt, timestep.substeps, timestep.swept, max_frames, max_score)
+    # With the genetic algorithm's weights shared, the next generation is spawned straight into shared memory
+    spawn = evaluator.spawn if evaluator is not None else BatchPopulation.spawn
+    shared_fitness = evaluator.store.fitness if evaluator is not None and evaluator.store is not None else None
+
+    def play(birds: BatchPopulation, generation_seed, observe=None) -> bool:
+        if evaluator is not None:
+            return evaluator.evaluate(birds, generation_seed)
+        return run_generation(birds, simulation, seed=generation_seed, profiler=profiler,
+                              stall_frames=stall_frames, timestep=timestep, recorder=recorder, metrics=observe)
+
+    population = BatchPopulation.from_agents(birds)
     for generation in range(ga.current_generation, max_generations):
         print(f"--- Generation {generation} ---")
+        if seed is None:
+            generation_seed = None
+        else:
+            generation_seed = seed if fixed_course else seed + generation
 
-        alive_birds = list(birds)
-        frame_count = 0
+        if metrics is not None:
+            metrics.begin(timestep)
+        with profiler.phase("evaluate"):
+            if curriculum is not None:
+                timed_out = curriculum.evaluate(population, generation_seed, evaluator, profiler)
+            elif cache is not None:
+                hits = cache.hits
+                timed_out = cache.evaluate(population, generation_seed, context,
+                                           lambda birds: play(birds, generation_seed))
+                profiler.count("cache_hits", cache.hits - hits)
+            else:
+                # Only a whole generation stepped here can be followed step by step
+                timed_out = play(population, generation_seed, metrics)
+        if timed_out:
+            print("Generation timeout - ending")
+        if recorder is not None:
+            recorder.end_generation(generation, population.score, bird_fitness(population))
 
-        # Setup game for the autonomous run
-        game.status = GAME_RUNNING
-        game.pipes = []
-        game.update_pipes()
+        if curriculum is not None:
+            scores = population.score.copy()
+            complete = curriculum.complete(population)
+            population, best_distance = end_generation(ga, population, generation, profiler,
+                                                       curriculum.fitness(population), spawn=spawn,
+                                                       metrics=metrics, champion_rows=curriculum.last_tier_rows())
+            promoted = curriculum.advance(scores, ga.species_of, ga.parents)
+            print(f"  Curriculum: {promoted} promoted, tiers {curriculum.describe()}")
+            if complete:
+                print(f"Last curriculum tier cleared in generation {generation}")
+                break
+        else:
+            scores = bird_fitness(population, out=shared_fitness)
+            population, best_distance = end_generation(ga, population, generation, profiler, scores,
+                                                       pin_clones=cache is not None, spawn=spawn,
+                                                       metrics=metrics)
+        if checkpoints is not None:
+            checkpoints.after_generation(ga, population)
 
-        # Game loop for the current generation
-        while alive_birds:
+        if best_distance > DISTANCE_TARGET:
+            print(f"Target distance of {DISTANCE_TARGET} reached! Best distance: {best_distance}")
+            break
 
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return
+    print("Training complete!")
+    population.write_back(ga.pool.agents)
+    return ga.pool.agents
 
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_ESCAPE]:
-                pygame.quit()
-                return
 
+def report_island(report: dict):
+    print(f"Island {report['island']} generation {report['generation']}: best score {report['best_score']}, "
+          f"best fitness {report['best_fitness']:.0f}, avg fitness {report['mean_fitness']:.0f}")
 
-            for bird in alive_birds:
-                next_pipe, second_pipe = game.get_closest_pipes(bird.y)
-                current_pipes = (next_pipe, second_pipe)
 
-                sensors = bird.get_sensors(current_pipes)
-                bird.make_decision(sensors)
+# K populations evolving side by side in their own processes and swapping elites now and then
+def run_island_mode(config: IslandConfig):
+    results = run_islands(config, report_island)
+    for result in results:
+        print(f"Island {result['island']}: best score {result['best_score']}, {result['immigrants']} immigrants taken")
+    champion = max(results, key=lambda result: result["best_score"])
+    print(f"Training complete! Best score {champion['best_score']} on island {champion['island']}")
+    return champion
 
-            frame += 1
-            game.update_game_state(alive_birds)
-            if frame % display_frame == 0:
 
-                alive_birds = [bird for bird in alive_birds if bird.is_alive]
-                game.render(alive_birds)
+# Handles the window while training is watched, returns False when the user asked to quit
+def handle_watch_events(watch: WatchMode, game: "FlappyBirdGame") -> bool:
+    import pygame
 
-                pygame.display.update()
-                clock.tick(FPS)
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            return False
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                return False
+            if event.key == pygame.K_h:
+                watch.toggle_headless()
+            elif event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                watch.faster()
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                watch.slower()
+            elif event.key == pygame.K_p:
+                game.show_overlay = not game.show_overlay
+    return True
 
-            frame_count += 1
 
-            if frame_count > 5000 or game.score >= 30:
-                print("Generation timeout - ending")
-                alive_birds = []
+def run_autonomous_mode(game: "FlappyBirdGame", ga: GeneticAlgorithm, birds, max_generations=100, seed=None,
+                        watch: WatchMode = None, checkpoints: CheckpointWriter = None, profiler=NULL_PROFILER,
+                        stall_frames=STALL_FRAMES, timestep: FixedTimestep = TICK,
+                        recorder: ReplayRecorder = None, metrics: GenerationMetrics = None):
+    import pygame
+    from FlappyBirdGame import GAME_RUNNING, game_reset
 
-        #NATURAL SELECTION & NEXT GENERATION
-        best_score = max(bird.score for bird in birds)
-        best_distance = max(bird.distance_traveled for bird in birds)
-        avg_distance = sum(bird.distance_traveled for bird in birds) / len(birds)
+    # H switches drawing off and on, + and - change the simulation speed, P shows the profiler overlay
+    if watch is None:
+        watch = WatchMode()
+    game.profiler = profiler
 
-        print(f"Generation {generation} ended:")
-        print(f"  Best score: {best_score}")
-        print(f"  Best distance: {best_distance} pixels")
-        print(f"  Avg distance: {avg_distance:.1f} pixels")
+    population = BatchPopulation.from_agents(birds)
+    for generation in range(ga.current_generation, max_generations):
+        print(f"--- Generation {generation} ---")
 
-        species_list = ga.speciate(birds)
-        ga.calculate_fitness(species_list)
-        birds = ga.create_next_generation(species_list)
-        game.reset_game_state_birds(birds)
+        frame_count = 0
+
+        # Setup game for the autonomous run
+        game.status = GAME_RUNNING
+        game.simulation.reset(seed + generation if seed is not None else None)
+        game.update_pipes()
+        stall = StallDetector(stall_frames)
+        if recorder is not None:
+            recorder.begin(population, game.simulation, timestep)
+        if metrics is not None:
+            metrics.begin(timestep)
+
+        # Game loop for the current generation, it only ever steps the birds still alive
+        while population.alive_count() > 0:
+            population.step(game.simulation, profiler, timestep)
+            if recorder is not None:
+                recorder.observe(population)
+            if metrics is not None:
+                metrics.observe(population)
+
+            if watch.step_done():
+                if not handle_watch_events(watch, game):
+                    pygame.quit()
+                    return
+
+                if not watch.headless:
+                    with profiler.phase("render"):
+                        population.write_back(birds)
+                        game.hud_status = watch.describe()
+                        game.render([bird for bird in birds if bird.is_alive])
+                        game.present()
+
+            frame_count += timestep.dt
+
+            if frame_count > MAX_GENERATION_FRAMES or game.score >= MAX_GENERATION_SCORE or \
+                    stall.update(population.alive_count()):
+                print("Generation timeout - ending")
+                break
+
+        if recorder is not None:
+            recorder.end_generation(generation, population.score, bird_fitness(population))
+        population, best_distance = end_generation(ga, population, generation, profiler, metrics=metrics)
+        game_reset(game)
+        if checkpoints is not None:
+            checkpoints.after_generation(ga, population)
 
         if best_distance > DISTANCE_TARGET:
             print(f"Target distance of {DISTANCE_TARGET} reached! Best distance: {best_distance}")
@@ -83,23 +255,134 @@ def run_autonomous_mode(game: FlappyBirdGame, ga: GeneticAlgorithm, birds, max_g
     print("Training complete!")
     pygame.quit()
 
+# Also returns the curriculum tiers of the resumed generation, None for a fresh run
+def create_population(args):
+    if args.resume:
+        checkpoint = load_checkpoint(args.resume)
+        print(f"Resuming from generation {checkpoint.generation}")
+        ga, birds = resume(checkpoint)
+        return ga, birds, args.seed if args.seed is not None else checkpoint.seed, checkpoint.tiers
+
+    if args.seed is not None:
+        # The first spawns are drawn by the agents from random, everything after from ga.rng
+        random.seed(args.seed)
+    ga = GeneticAlgorithm(population_size=args.population, seed=args.seed,
+                          controller=Controller(args.hidden, args.sensors))
+    return ga, ga.initial_population, args.seed, None
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flappy Bird with a genetic algorithm")
+    parser.add_argument("--headless", action="store_true", help="train without opening a window")
+    parser.add_argument("--population", type=int, default=100)
+    parser.add_argument("--generations", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1, help="processes used to evaluate a headless generation")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the pipe course, generation n uses seed + n")
+    parser.add_argument("--display-fps", type=int, default=DISPLAY_FPS, help="frames drawn per second while watching")
+    parser.add_argument("--sim-rate", type=int, default=0, help="simulation steps per second while watching, 0 is unlimited")
+    parser.add_argument("--checkpoint", default=None, help="file the training state is saved to")
+    parser.add_argument("--checkpoint-every", type=int, default=1, help="generations between two checkpoints")
+    parser.add_argument("--resume", default=None, help="checkpoint file to continue training from")
+    parser.add_argument("--stall-frames", type=int, default=STALL_FRAMES,
+                        help="end a generation after this many steps without a death, 0 disables it")
+    parser.add_argument("--dt", type=float, default=1, help="ticks simulated per step, above 1 uses swept collision")
+    parser.add_argument("--substeps", type=int, default=1, help="segments the swept collision splits a step into")
+    parser.add_argument("--difficulty", choices=sorted(SCHEDULES), default="constant",
+                        help="how pipe speed and spacing change with the score")
+    parser.add_argument("--curriculum", action="store_true",
+                        help="train headless on difficulty tiers of growing length, birds move up as they clear them")
+    parser.add_argument("--fixed-course", action="store_true",
+                        help="play the same course every generation instead of seed + n")
+    parser.add_argument("--fitness-cache", action="store_true",
+                        help="replay champions on a fixed course from cache instead of simulating them again")
+    parser.add_argument("--record", default=None,
+                        help="replay log the champion and first death of every generation are appended to")
+    parser.add_argument("--sensors", choices=sorted(SENSOR_SCALES), default="basic",
+                        help="extended adds the velocity and the gap after the next one")
+    parser.add_argument("--hidden", type=int, nargs="*", default=[], help="sizes of the hidden layers of the brains")
+    parser.add_argument("--islands", type=int, default=1,
+                        help="train headless as this many separate populations in their own processes")
+    parser.add_argument("--migration-interval", type=int, default=MIGRATION_INTERVAL,
+                        help="generations between two exchanges of elites between islands, 0 never exchanges")
+    parser.add_argument("--migrants", type=int, default=MIGRANTS, help="elites an island sends at every exchange")
+    parser.add_argument("--profile", action="store_true", help="time the phases of the game loop")
+    parser.add_argument("--profile-log", default=None, help="JSON lines file the per-generation profile goes to")
+    parser.add_argument("--metrics-log", default=None,
+                        help="JSON lines file the score and distance quantiles, survival curve and species count "
+                             "of every generation are appended to")
+    parser.add_argument("--overlay", action="store_true", help="show the profiler figures on screen")
+    args = parser.parse_args()
+
+    profiler = Profiler(args.profile_log) if args.profile or args.profile_log or args.overlay else NULL_PROFILER
+    timestep = FixedTimestep(args.dt, args.substeps) if args.dt != 1 or args.substeps != 1 else TICK
+    schedule = SCHEDULES[args.difficulty]
+    # Only aggregated when they are written somewhere, end_generation scans the arrays otherwise
+    metrics = GenerationMetrics(MetricsWriter(args.metrics_log)) if args.metrics_log else None
+
+    if args.headless and args.islands > 1:
+        config = IslandConfig(args.islands, args.population, args.generations,
+                              args.seed if args.seed is not None else random.randrange(2 ** 31),
+                              args.migration_interval, args.migrants, Controller(args.hidden, args.sensors), schedule,
+                              timestep, args.stall_frames)
+        run_island_mode(config)
+        raise SystemExit(0)
+
+    if args.headless:
+        ga, birds, seed, tiers = create_population(args)
+        curriculum = Curriculum(ga.population_size, stall_frames=args.stall_frames, timestep=timestep) \
+            if args.curriculum else None
+        if curriculum is not None:
+            curriculum.restore(tiers)
+        checkpoints = CheckpointWriter(args.checkpoint, args.checkpoint_every, seed, curriculum) \
+            if args.checkpoint else None
+        cache = FitnessCache() if args.fitness_cache else None
+        recorder = ReplayRecorder(args.record) if args.record else None
+        if args.workers > 1:
+            with ParallelEvaluator(args.workers, stall_frames=args.stall_frames, timestep=timestep,
+                                   schedule=schedule) as evaluator:
+                evaluator.share(ga)
+                run_headless_mode(Simulation(schedule=schedule), ga, birds, args.generations, evaluator, seed, checkpoints, profiler,
+                                  curriculum=curriculum, fixed_course=args.fixed_course, cache=cache,
+                                  recorder=recorder, metrics=metrics)
+        else:
+            run_headless_mode(Simulation(schedule=schedule), ga, birds, args.generations, seed=seed, checkpoints=checkpoints,
+                              profiler=profiler, stall_frames=args.stall_frames, timestep=timestep,
+                              curriculum=curriculum, fixed_course=args.fixed_course, cache=cache,
+                              recorder=recorder, metrics=metrics)
+        profiler.close()
+        if metrics is not None:
+            metrics.close()
+        raise SystemExit(0)
+
+    import pygame
+    from FlappyBirdGame import FlappyBirdGame, GAME_CLOSE, GAME_RUNNING
+
     pygame.init()
 
-    game = FlappyBirdGame(autonomous_mode=False)
+    game = FlappyBirdGame(autonomous_mode=False, schedule=schedule)
+    game.profiler = profiler
+    game.show_overlay = args.overlay
+    # Manual games are recorded too
+    recorder = ReplayRecorder(args.record) if args.record else None
+    game.recorder = recorder
     manual_bird = FlappyBirdAgent()
 
     while game.status != GAME_CLOSE:
 
         if game.autonomous_mode and game.status == GAME_RUNNING:
 
-            ga = GeneticAlgorithm(population_size=100)
-            initial_birds = ga.initial_population
+            ga, initial_birds, seed, _ = create_population(args)
+            checkpoints = CheckpointWriter(args.checkpoint, args.checkpoint_every, seed) if args.checkpoint else None
 
-            run_autonomous_mode(game, ga, initial_birds)
+            run_autonomous_mode(game, ga, initial_birds, args.generations, seed,
+                                WatchMode(args.display_fps, args.sim_rate), checkpoints, profiler, args.stall_frames,
+                                timestep, recorder, metrics)
             break
 
         game.update_frame(manual_bird)
 
+    profiler.close()
+    if metrics is not None:
+        metrics.close()
     if game.status == GAME_CLOSE:
         pygame.quit()
\ No newline at end of file
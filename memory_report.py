@@ -0,0 +1,51 @@
+import argparse
+import gc
+import random
+import tracemalloc
+
+from GeneticAlgorithm import GeneticAlgorithm
+
+
+# Memory held per bird right after the initial population is built
+def memory_per_bird(size: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    ga = GeneticAlgorithm(population_size=size)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ga
+    return used / size
+
+
+# Blocks allocated by one generation turnover (speciation excluded) that are still alive afterwards
+def turnover_allocations(size: int) -> tuple[int, int]:
+    ga = GeneticAlgorithm(population_size=size)
+    birds = ga.initial_population
+    for bird in birds:
+        bird.score = random.randint(0, 30)
+    species_list = ga.calculate_fitness(ga.speciate(birds))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    new_birds = ga.create_next_generation(species_list)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del new_birds
+    return blocks, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory used by the population")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"{'birds':>8} {'bytes/bird':>12} {'new blocks/gen':>16} {'peak KiB/gen':>14}")
+    for size in args.sizes:
+        per_bird = memory_per_bird(size)
+        blocks, peak = turnover_allocations(size)
+        print(f"{size:>8} {per_bird:>12.1f} {blocks:>16} {peak / 1024:>14.1f}")
@@ -0,0 +1,76 @@
+import argparse
+import time
+
+from FlappyBirdAgent import FlappyBirdAgent
+from Replay import REASONS, ReplayRecord, fast_forward, read_replays, replay_step
+
+
+def list_records(records: list[ReplayRecord]):
+    for index, record in enumerate(records):
+        print(f"{index:>5} generation {record.generation:>5} {REASONS.get(record.reason, record.reason):<12} "
+              f"seed {record.seed:>10} steps {len(record):>6} score {record.score:>4}")
+
+
+# Plays every record again headless and checks it ends with the score it was recorded with
+def verify(records: list[ReplayRecord]) -> int:
+    failures = 0
+    start = time.perf_counter()
+    steps = 0
+    for index, record in enumerate(records):
+        _, population, played = fast_forward(record)
+        steps += played
+        score = int(population.score[0])
+        if score != record.score:
+            failures += 1
+            print(f"record {index}: replayed score {score}, recorded {record.score}")
+    seconds = time.perf_counter() - start
+    print(f"{len(records) - failures}/{len(records)} replays match, {steps} steps in {seconds:.2f}s")
+    return failures
+
+
+# Simulates the record headless up to `frame`, then draws the rest of the run at `fps`
+def watch(record: ReplayRecord, frame: int, fps: int):
+    import pygame
+    from FlappyBirdGame import FlappyBirdGame, GAME_RUNNING
+
+    simulation, population, step = fast_forward(record, frame)
+    print(f"Fast forwarded to step {step} of {len(record)}")
+
+    pygame.init()
+    game = FlappyBirdGame(schedule=record.schedule)
+    game.simulation = simulation
+    game.status = GAME_RUNNING
+    bird = FlappyBirdAgent()
+    clock = pygame.time.Clock()
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                pygame.quit()
+                return
+
+        population.write_back([bird])
+        game.render([bird] if bird.is_alive else [])
+        game.present()
+        if step < len(record) and population.alive_count() > 0:
+            replay_step(record, simulation, population, step)
+            step += 1
+        clock.tick(fps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lists, checks and plays back recorded runs")
+    parser.add_argument("log", help="replay log written with --record")
+    parser.add_argument("--index", type=int, default=None, help="record to play back, see the list")
+    parser.add_argument("--frame", type=int, default=0, help="step simulated headless before drawing starts")
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--verify", action="store_true", help="replay every record headless and compare scores")
+    args = parser.parse_args()
+
+    records = read_replays(args.log)
+    if args.verify:
+        raise SystemExit(1 if verify(records) else 0)
+    if args.index is None:
+        list_records(records)
+    else:
+        watch(records[args.index], args.frame, args.fps)
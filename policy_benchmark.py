@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from Controller import Controller, SENSOR_SCALES
+from GAME_CONSTANTS import SCREEN_HEIGHT, SCREEN_WIDTH
+from Policy import Policy, load_policy
+from PolicyServer import MAX_BATCH, MAX_DELAY, PolicyClient, PolicyServer
+
+
+# Readings in the ranges BatchPopulation.get_sensors gives during a game
+def random_sensors(rng: np.random.Generator, count: int, sensor_count: int) -> np.ndarray:
+    sensors = np.empty((count, sensor_count))
+    sensors[:, 0] = rng.uniform(-SCREEN_HEIGHT / 2, SCREEN_HEIGHT / 2, count)
+    sensors[:, 1] = rng.uniform(0, SCREEN_WIDTH, count)
+    sensors[:, 2] = rng.uniform(-SCREEN_HEIGHT / 2, SCREEN_HEIGHT / 2, count)
+    sensors[:, 3] = 1
+    if sensor_count > 4:
+        sensors[:, 4] = rng.uniform(-7, 10, count)
+        sensors[:, 5] = rng.uniform(-SCREEN_HEIGHT / 2, SCREEN_HEIGHT / 2, count)
+    return sensors
+
+
+# One game client: `requests` requests one after the other, returns the latency of each in seconds
+async def client(host: str, port: int, sensors: np.ndarray) -> list[float]:
+    connection = await PolicyClient.connect(host, port)
+    latencies = []
+    try:
+        for row in sensors:
+            start = time.perf_counter()
+            await connection.act(row)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await connection.close()
+    return latencies
+
+
+async def load_test(policy: Policy, clients: int, requests: int, max_batch: int, max_delay: float,
+                    seed: int, host: str = None, port: int = None) -> dict:
+    server = None
+    if host is None:
+        # Server in this process, on a free local port
+        server = PolicyServer(policy, port=0, max_batch=max_batch, max_delay=max_delay)
+        host, port = server.host, await server.start()
+
+    rng = np.random.default_rng(seed)
+    sensors = [random_sensors(rng, requests, policy.sensor_count) for _ in range(clients)]
+    start = time.perf_counter()
+    latencies = np.concatenate(await asyncio.gather(*(client(host, port, rows) for rows in sensors)))
+    seconds = time.perf_counter() - start
+
+    result = {"clients": clients, "requests": len(latencies), "seconds": seconds,
+              "requests_per_second": len(latencies) / seconds,
+              "p50_ms": float(np.quantile(latencies, 0.5)) * 1000, "p99_ms": float(np.quantile(latencies, 0.99)) * 1000,
+              "max_ms": float(latencies.max()) * 1000}
+    if server is not None:
+        result["mean_batch"] = server.batcher.mean_batch
+        await server.close()
+    return result
+
+
+# The same answers computed one request at a time in this process, what every game running its own brain costs
+def unbatched(policy: Policy, requests: int, seed: int) -> dict:
+    sensors = random_sensors(np.random.default_rng(seed), requests, policy.sensor_count)
+    start = time.perf_counter()
+    for row in sensors:
+        policy.act(row)
+    seconds = time.perf_counter() - start
+    return {"requests": requests, "seconds": seconds, "requests_per_second": requests / seconds}
+
+
+def print_result(result: dict):
+    line = f"{result['clients']:>5} clients: {result['requests_per_second']:>9.0f} req/s, " \
+           f"p50 {result['p50_ms']:.3f} ms, p99 {result['p99_ms']:.3f} ms"
+    if "mean_batch" in result:
+        line += f", {result['mean_batch']:.1f} requests per batch"
+    print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the policy server: latency and throughput")
+    parser.add_argument("--policy", default=None, help="policy file, a random brain is used without one")
+    parser.add_argument("--sensors", choices=sorted(SENSOR_SCALES), default="basic", help="for the random brain")
+    parser.add_argument("--hidden", type=int, nargs="*", default=[], help="for the random brain")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64, 256],
+                        help="concurrent clients, one run per value")
+    parser.add_argument("--requests", type=int, default=200, help="requests sent by every client")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-delay", type=float, default=MAX_DELAY * 1000, help="milliseconds")
+    parser.add_argument("--connect", default=None, help="host:port of a running server instead of one in this process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file the results are written to")
+    args = parser.parse_args()
+
+    if args.policy is not None:
+        policy = load_policy(args.policy)
+    else:
+        controller = Controller(args.hidden, args.sensors)
+        policy = Policy(controller, np.random.default_rng(args.seed).uniform(-1, 1, controller.parameter_count))
+    host, port = None, None
+    if args.connect is not None:
+        host, _, port = args.connect.rpartition(":")
+        port = int(port)
+
+    baseline = unbatched(policy, args.requests * 10, args.seed)
+    print(f"unbatched in process: {baseline['requests_per_second']:.0f} req/s")
+    results = []
+    for clients in args.clients:
+        result = asyncio.run(load_test(policy, clients, args.requests, args.max_batch, args.max_delay / 1000,
+                                       args.seed, host, port))
+        results.append(result)
+        print_result(result)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"policy": policy.controller.spec, "unbatched": baseline, "runs": results}, file, indent=2)
@@ -0,0 +1,29 @@
+import argparse
+import asyncio
+
+from Policy import load_policy
+from PolicyServer import HOST, MAX_BATCH, MAX_DELAY, PORT, PolicyServer
+
+
+async def serve(server: PolicyServer):
+    port = await server.start()
+    print(f"Serving {server.policy.controller.spec} policy on {server.host}:{port}")
+    await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answers flap requests of game clients with one trained policy")
+    parser.add_argument("policy", help="policy file written by export_policy.py")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="requests answered by one forward pass")
+    parser.add_argument("--max-delay", type=float, default=MAX_DELAY * 1000,
+                        help="milliseconds a request waits for others to join its batch")
+    args = parser.parse_args()
+
+    server = PolicyServer(load_policy(args.policy), args.host, args.port, args.max_batch, args.max_delay / 1000)
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        print(f"{server.batcher.requests} requests in {server.batcher.batches} batches "
+              f"({server.batcher.mean_batch:.1f} per batch)")
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from Checkpoint import load_checkpoint, resume, save_checkpoint
+from Controller import Controller
+from GeneticAlgorithm import GeneticAlgorithm
+
+
+@pytest.mark.parametrize("controller", [
+    # More than 65535 parameters per bird
+    Controller((256, 256)),
+    # Spec longer than 32 bytes
+    Controller((16,) * 9, "extended"),
+])
+def test_round_trip(tmp_path, controller):
+    path = str(tmp_path / "checkpoint.bin")
+    ga = GeneticAlgorithm(population_size=3, seed=1, controller=controller)
+    ga.track_champion(np.array([0, 5, 2]))
+    save_checkpoint(path, ga, seed=7)
+
+    checkpoint = load_checkpoint(path)
+    assert checkpoint.controller == controller
+    assert checkpoint.seed == 7
+    assert checkpoint.best_score == 5
+    assert checkpoint.weights.shape == (3, controller.parameter_count)
+    np.testing.assert_allclose(checkpoint.weights, ga.pool.weights, rtol=1e-6)
+
+    resumed, _ = resume(checkpoint)
+    assert resumed.controller == controller
+    np.testing.assert_allclose(resumed.pool.weights, ga.pool.weights, rtol=1e-6)
@@ -0,0 +1,47 @@
+import contextlib
+import io
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation
+from Curriculum import Curriculum
+from GeneticAlgorithm import GeneticAlgorithm
+from main import end_generation
+
+
+def population(score, distance, closeness):
+    birds = BatchPopulation(np.zeros((len(score), 4)), np.zeros(len(score)), np.zeros(len(score)), np.zeros(len(score)))
+    birds.score[:] = score
+    birds.distance_traveled[:] = distance
+    birds.gap_closeness[:] = closeness
+    return birds
+
+
+def test_equal_scores_ranked_by_distance():
+    curriculum = Curriculum(2)
+    fitness = curriculum.fitness(population([2, 2], [500, 800], [0, 0]))
+    assert fitness[1] > fitness[0]
+
+
+def test_higher_tier_always_ranks_higher():
+    curriculum = Curriculum(2)
+    curriculum.tier_of[:] = [0, 1]
+    best = curriculum.tiers[0]
+    # Best run the first tier allows against the worst run on the second
+    fitness = curriculum.fitness(population([best.max_score, 0], [best.max_frames * max(best.schedule.speeds), 0],
+                                            [best.max_frames, 0]))
+    assert fitness[1] > fitness[0]
+
+
+def test_easy_tier_score_cannot_become_champion():
+    curriculum = Curriculum(2)
+    last = len(curriculum.tiers) - 1
+    curriculum.tier_of[:] = [1, last]
+    birds = population([8, 7], [1000, 900], [0, 0])
+    ga = GeneticAlgorithm(population_size=2, seed=0)
+    last_tier_weights = ga.pool.weights[1].tolist()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        end_generation(ga, birds, 0, fitness=curriculum.fitness(birds), champion_rows=curriculum.last_tier_rows())
+    assert ga.best_score == 7
+    assert ga.best_weights == last_tier_weights
@@ -0,0 +1,16 @@
+from Fitness import PIPE_FITNESS
+from GeneticAlgorithm import GeneticAlgorithm
+
+
+def test_object_api_ranks_on_fitness():
+    ga = GeneticAlgorithm(population_size=2, seed=3)
+    birds = ga.initial_population
+    # Further, but one pipe less
+    birds[0].distance_traveled, birds[0].score = 350, 1
+    birds[1].distance_traveled, birds[1].score = 300, 2
+
+    species_list = ga.calculate_fitness(ga.speciate(birds))
+
+    assert len(species_list) == 1
+    assert species_list[0].birds == [birds[1], birds[0]]
+    assert species_list[0].average_fitness == (650 + 3 * PIPE_FITNESS) / 2
@@ -0,0 +1,33 @@
+import numpy as np
+
+from Islands import Island, IslandConfig, LocalTransport, run_islands_locally
+
+
+def config(**changes) -> IslandConfig:
+    return IslandConfig(**{"islands": 2, "population_size": 20, "generations": 2, "seed": 3, "interval": 1,
+                           "migrants": 1, "stall_frames": 0, **changes})
+
+
+def test_elite_migrates_to_next_island():
+    settings = config()
+    transport = LocalTransport(settings.islands)
+    first, second = (Island(index, settings, transport) for index in range(settings.islands))
+
+    first.step()
+    elite, = transport.inboxes[1]
+    assert elite.shape == (1, settings.controller.parameter_count)
+
+    second.step()
+    assert second.immigrants == 1
+    assert any(np.array_equal(row, elite[0]) for row in second.ga.pool.weights)
+    # Island 1 sent its own elite on to island 0
+    assert len(transport.inboxes[0]) == 1
+
+
+def test_local_runs_repeat():
+    report = lambda _: None
+    first = run_islands_locally(config(), report)
+    second = run_islands_locally(config(), report)
+    assert [result["immigrants"] for result in first] == [1, 2]
+    for a, b in zip(first, second):
+        assert a["best_weights"] == b["best_weights"]
@@ -0,0 +1,23 @@
+import numpy as np
+
+from Controller import Controller
+from Perceptron import Perceptron
+from Policy import Policy, load_policy, save_policy
+
+
+def test_long_spec_round_trip(tmp_path):
+    controller = Controller((16,) * 9, "extended")
+    assert len(controller.spec) > 32
+    rng = np.random.default_rng(0)
+    weights = rng.uniform(-1, 1, controller.parameter_count)
+    path = str(tmp_path / "champion.policy")
+    save_policy(path, Policy(controller, weights, best_score=12, generation=40))
+
+    policy = load_policy(path)
+    assert policy.controller == controller
+    assert (policy.best_score, policy.generation) == (12, 40)
+    np.testing.assert_array_equal(policy.weights, weights)
+
+    sensors = rng.uniform(-500, 500, (20, controller.sensor_count))
+    expected = [Perceptron(weights, controller).feed_forward(row) for row in sensors]
+    np.testing.assert_allclose(policy.flap_probability(sensors), expected)
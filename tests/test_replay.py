@@ -0,0 +1,27 @@
+import random
+
+import numpy as np
+
+from Difficulty import CLASSIC
+from Physics import TICK
+from Replay import CHAMPION, ReplayRecord, fast_forward, read_replays, write_replays
+
+
+def test_large_seed_round_trip(tmp_path):
+    path = str(tmp_path / "replays.bin")
+    seed = 2 ** 32 + 3
+    flaps = np.array([True, False, False, True, True])
+    write_replays(path, [ReplayRecord(4, CHAMPION, seed, CLASSIC, TICK, (300.0, 100.0, -7.0), flaps, 2, [0.1] * 4)])
+
+    record, = read_replays(path)
+    assert record.seed == seed
+    assert record.schedule == CLASSIC
+    np.testing.assert_array_equal(record.flaps, flaps)
+
+
+def test_fast_forward_leaves_random_alone():
+    record = ReplayRecord(0, CHAMPION, 5, CLASSIC, TICK, (300.0, 100.0, -7.0), [True] + [False] * 30, 0)
+    random.seed(1)
+    state = random.getstate()
+    fast_forward(record)
+    assert random.getstate() == state
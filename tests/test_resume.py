@@ -0,0 +1,63 @@
+import contextlib
+import io
+import random
+
+import numpy as np
+
+from Checkpoint import CheckpointWriter, load_checkpoint, resume
+from Curriculum import Curriculum
+from GeneticAlgorithm import GeneticAlgorithm
+from Simulation import Simulation
+from main import run_headless_mode
+
+SEED = 11
+
+
+def train(ga, birds, generations, checkpoints=None, curriculum=None) -> list[str]:
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        run_headless_mode(Simulation(), ga, birds, generations, seed=SEED, checkpoints=checkpoints, stall_frames=0,
+                          curriculum=curriculum)
+    return [line for line in out.getvalue().splitlines() if line.startswith(("  Best", "  Curriculum"))]
+
+
+def fresh() -> GeneticAlgorithm:
+    random.seed(SEED)
+    return GeneticAlgorithm(population_size=60, seed=SEED)
+
+
+def test_resumed_run_matches_uninterrupted(tmp_path):
+    path = str(tmp_path / "checkpoint.bin")
+    ga = fresh()
+    uninterrupted = train(ga, ga.initial_population, 6)
+
+    first = fresh()
+    before = train(first, first.initial_population, 3, CheckpointWriter(path, seed=SEED))
+    # Whatever ran in between must not matter
+    random.random()
+    resumed, birds = resume(load_checkpoint(path))
+    after = train(resumed, birds, 6)
+
+    assert before + after == uninterrupted
+    # The checkpoint stores the weights as float32
+    np.testing.assert_allclose(resumed.pool.weights, ga.pool.weights, rtol=1e-5, atol=1e-6)
+
+
+def test_resumed_curriculum_run_matches_uninterrupted(tmp_path):
+    path = str(tmp_path / "checkpoint.bin")
+    ga = fresh()
+    curriculum = Curriculum(ga.population_size, stall_frames=0)
+    uninterrupted = train(ga, ga.initial_population, 6, curriculum=curriculum)
+
+    first = fresh()
+    first_curriculum = Curriculum(first.population_size, stall_frames=0)
+    before = train(first, first.initial_population, 3, CheckpointWriter(path, seed=SEED, curriculum=first_curriculum),
+                   first_curriculum)
+    checkpoint = load_checkpoint(path)
+    np.testing.assert_array_equal(checkpoint.tiers, first_curriculum.tier_of)
+    resumed, birds = resume(checkpoint)
+    resumed_curriculum = Curriculum(resumed.population_size, stall_frames=0)
+    resumed_curriculum.restore(checkpoint.tiers)
+    after = train(resumed, birds, 6, curriculum=resumed_curriculum)
+
+    assert before + after == uninterrupted
+    np.testing.assert_array_equal(resumed_curriculum.tier_of, curriculum.tier_of)
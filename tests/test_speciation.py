@@ -0,0 +1,47 @@
+import numpy as np
+
+from GeneticAlgorithm import SPECIATION_THRESHOLD
+from Speciation import GRID_MIN_BIRDS, _assign_dense, assign_species
+
+
+# The per-bird loop assign_species replaces: every bird joins the first species whose representative is closer
+# than threshold, or starts a new one. Distances are summed weight by weight like the old generator did.
+def reference_species(weights: np.ndarray, threshold: float) -> tuple[np.ndarray, list[int]]:
+    species_of = np.empty(len(weights), dtype=np.int64)
+    representatives = np.empty_like(weights)
+    rows: list[int] = []
+    for bird, bird_weights in enumerate(weights):
+        differences = np.abs(representatives[:len(rows)] - bird_weights)
+        distance = np.zeros(len(rows))
+        for k in range(weights.shape[1]):
+            distance += differences[:, k]
+        closer = np.flatnonzero(distance < threshold)
+        if len(closer) > 0:
+            species_of[bird] = closer[0]
+        else:
+            species_of[bird] = len(rows)
+            representatives[len(rows)] = bird_weights
+            rows.append(bird)
+    return species_of, rows
+
+
+def test_dense_assignment_matches_loop():
+    weights = np.random.default_rng(1).uniform(-1, 1, (2000, 9))
+    threshold = SPECIATION_THRESHOLD * 9 / 4
+    species_of, representatives = assign_species(weights, threshold)
+    expected_species, expected_representatives = reference_species(weights, threshold)
+
+    np.testing.assert_array_equal(species_of, expected_species)
+    assert representatives == expected_representatives
+
+
+def test_grid_assignment_matches_loop():
+    weights = np.random.default_rng(2).uniform(-1, 1, (GRID_MIN_BIRDS + 4000, 4))
+    # Large and spread out enough that assign_species hands the birds over to the grid
+    assert len(_assign_dense(weights, SPECIATION_THRESHOLD, stop_when_sparse=True)[2]) >= GRID_MIN_BIRDS
+
+    species_of, representatives = assign_species(weights, SPECIATION_THRESHOLD)
+    expected_species, expected_representatives = reference_species(weights, SPECIATION_THRESHOLD)
+
+    np.testing.assert_array_equal(species_of, expected_species)
+    assert representatives == expected_representatives
@@ -0,0 +1,60 @@
+import argparse
+import time
+
+import numpy as np
+
+from BatchPopulation import BatchPopulation, run_generation
+from GAME_CONSTANTS import MAX_GENERATION_FRAMES
+from Physics import FixedTimestep, TICK
+from Simulation import Simulation
+
+
+# Same birds at the same starting positions for every run, with brains spread over the whole weight range
+def make_population(size: int, seed: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    weights = rng.uniform(-1, 1, (size, 4))
+    spawn = BatchPopulation.spawn(weights, rng)
+    return weights, spawn.x, spawn.y, spawn.velocity
+
+
+def play(birds, timestep: FixedTimestep, seed: int, max_frames: int) -> tuple[BatchPopulation, float]:
+    population = BatchPopulation(*birds)
+    start = time.perf_counter()
+    run_generation(population, Simulation(seed), max_frames, max_score=10 ** 9, seed=seed, timestep=timestep)
+    return population, time.perf_counter() - start
+
+
+# How far a run's outcome is from the tick by tick reference, as far as the genetic algorithm is concerned:
+# who survives, the scores, and whether the same birds end up in the top share that gets to breed
+def compare(reference: BatchPopulation, result: BatchPopulation, top_share: float = 0.1) -> dict:
+    top = max(1, int(len(reference) * top_share))
+    reference_top = set(np.argsort(-reference.score, kind="stable")[:top].tolist())
+    result_top = set(np.argsort(-result.score, kind="stable")[:top].tolist())
+    difference = np.abs(result.score - reference.score)
+    return {"same_fate": float(np.mean(result.alive == reference.alive)),
+            "same_score": float(np.mean(difference == 0)),
+            "mean_score_difference": float(difference.mean()),
+            "max_score_difference": int(difference.max()),
+            "top_overlap": len(reference_top & result_top) / top}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares coarse timesteps with the tick by tick game")
+    parser.add_argument("--population", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frames", type=int, default=MAX_GENERATION_FRAMES, help="ticks a generation may last")
+    parser.add_argument("--dt", type=float, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--substeps", type=int, default=1)
+    args = parser.parse_args()
+
+    birds = make_population(args.population, args.seed)
+    reference, reference_seconds = play(birds, TICK, args.seed, args.frames)
+    print(f"reference: tick by tick, {reference_seconds * 1000:.0f} ms")
+    print(f"{'dt':>6} {'same fate':>10} {'same score':>11} {'mean diff':>10} {'max diff':>9} {'top 10%':>8} "
+          f"{'speedup':>8}")
+    for dt in args.dt:
+        result, seconds = play(birds, FixedTimestep(dt, args.substeps), args.seed, args.frames)
+        report = compare(reference, result)
+        print(f"{dt:>6g} {report['same_fate']:>10.1%} {report['same_score']:>11.1%} "
+              f"{report['mean_score_difference']:>10.3f} {report['max_score_difference']:>9} "
+              f"{report['top_overlap']:>8.1%} {reference_seconds / seconds:>7.1f}x")